@@ -30,10 +30,47 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 587
     SMTP_USERNAME: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
+    # Pooled SMTP connections per process (keep within the provider's connection limit)
+    SMTP_POOL_SIZE: int = 5
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    SMTP_POOL_IDLE_TIMEOUT: int = 60
+    # Sends per second per SMTP account, shared by all processes through Redis
+    SMTP_SEND_RATE_PER_SECOND: float = 5
+    SMTP_SEND_BURST: int = 10
+    # Compiled message templates are cached here across restarts (system temp dir if unset)
+    TEMPLATE_BYTECODE_CACHE_DIR: Optional[str] = None
     
     # WhatsApp (Mock for demo)
     WHATSAPP_API_URL: str = "https://api.whatsapp.com/send"
     WHATSAPP_TOKEN: Optional[str] = None
+    # Provider throughput tier per sender number, shared by all consumers through Redis
+    WHATSAPP_SENDER_ID: str = "default"
+    WHATSAPP_SEND_RATE_PER_SECOND: float = 20
+    WHATSAPP_SEND_BURST: int = 20
+    # Seconds campaign title/brand/description stay cached in the WhatsApp consumer
+    WHATSAPP_CAMPAIGN_CACHE_TTL: int = 60
+    # Pooled async HTTP client for WhatsApp sends
+    WHATSAPP_HTTP_TIMEOUT: int = 10
+    WHATSAPP_HTTP_MAX_CONCURRENCY: int = 50
+    # Inbound webhook messages are stored, acked, and answered by background workers;
+    # each worker waits for its reply to go out, so this bounds the replies in flight
+    WHATSAPP_INBOUND_WORKERS: int = 20
+    WHATSAPP_INBOUND_QUEUE_SIZE: int = 1000
+    # Seconds before a message claimed by a dead instance is picked up again (a failed
+    # reply is released for the next poll), and how often to try
+    WHATSAPP_INBOUND_STALE_AFTER: int = 600
+    WHATSAPP_INBOUND_MAX_ATTEMPTS: int = 3
+    # Mobile -> conversation routes cached in the WhatsApp business service (also invalidated via NOTIFY)
+    CONVERSATION_ROUTE_CACHE_TTL: int = 300
+    # Assistant runs: one at a time per thread, messages arriving within the window share a run
+    WHATSAPP_MAX_CONCURRENT_RUNS: int = 50
+    WHATSAPP_COALESCE_WINDOW_MS: int = 750
+    # Negotiation outcomes from assistant tool calls are written back in batches
+    NEGOTIATION_FLUSH_ROWS: int = 200
+    NEGOTIATION_FLUSH_INTERVAL_MS: int = 500
+    # Campaign assistants are provisioned by a background worker (woken via NOTIFY, else polled)
+    ASSISTANT_JOB_POLL_INTERVAL: int = 30
+    ASSISTANT_JOB_STALE_AFTER: int = 600
     
     
     # CORS
@@ -50,7 +87,55 @@ class Settings(BaseSettings):
     RABBITMQ_VHOST: str = None
     WHATSAPP_QUEUE_NAME: str = None
 
+    # Retry policies (exponential backoff through per-attempt delay queues)
+    EMAIL_QUEUE_MAX_RETRIES: int = 5
+    EMAIL_QUEUE_RETRY_BASE_DELAY: int = 10
+    WHATSAPP_QUEUE_MAX_RETRIES: int = 5
+    WHATSAPP_QUEUE_RETRY_BASE_DELAY: int = 10
+    QUEUE_RETRY_MAX_DELAY: int = 900
+
+    # Consumer concurrency (also the AMQP prefetch count; keep below the DB pool size)
+    EMAIL_CONSUMER_CONCURRENCY: int = 10
+    WHATSAPP_CONSUMER_CONCURRENCY: int = 10
+    # Deliveries fetched from the DB in one query (capped by the concurrency)
+    EMAIL_CONSUMER_BATCH_SIZE: int = 10
+    CONSUMER_BATCH_LINGER_MS: int = 20
+    # Outreach SENT (and FAILED once dead-lettered) write-back, flushed as one UPDATE per batch
+    OUTREACH_STATUS_FLUSH_ROWS: int = 200
+    OUTREACH_STATUS_FLUSH_INTERVAL_MS: int = 200
+    # Idempotency keys in Redis: claim while sending, remember sends for a week
+    OUTREACH_DEDUP_PROCESSING_TTL: int = 300
+    OUTREACH_DEDUP_SENT_TTL: int = 604800
+
+    # Transactional outbox relayed to RabbitMQ by the API process
+    OUTBOX_RELAY_BATCH_SIZE: int = 500
+    OUTBOX_RELAY_POLL_INTERVAL: float = 1.0
+    OUTBOX_RETENTION_HOURS: int = 24
+
+    # Consumer metrics (Prometheus text format on /metrics); each channel owns
+    # the ports base..base + <CHANNEL>_CONSUMER_MAX_WORKERS - 1, one per worker slot
+    EMAIL_CONSUMER_METRICS_PORT: int = 9101
+    WHATSAPP_CONSUMER_METRICS_PORT: int = 9201
+    QUEUE_DEPTH_CHECK_INTERVAL: int = 15
+    CONSUMER_DRAIN_TIMEOUT: int = 30
+
+    # Consumer worker pools supervised by run.py
+    CONSUMER_WORKER_INDEX: int = 0  # set per worker process by the supervisor
+    EMAIL_CONSUMER_MIN_WORKERS: int = 1
+    EMAIL_CONSUMER_MAX_WORKERS: int = 4
+    WHATSAPP_CONSUMER_MIN_WORKERS: int = 1
+    WHATSAPP_CONSUMER_MAX_WORKERS: int = 4
+    CONSUMER_SCALE_MESSAGES_PER_WORKER: int = 200
+    CONSUMER_SCALE_INTERVAL: int = 10
+    CONSUMER_SCALE_DOWN_COOLDOWN: int = 120
+    # Per-contact ordering only holds inside one worker process: pin each pool to one worker
+    CONSUMER_STRICT_ORDERING: bool = False
+
     OPENAI_API_KEY: str
+    # Assistants API calls from the WhatsApp business service
+    OPENAI_HTTP_TIMEOUT: int = 30
+    OPENAI_RUN_TIMEOUT: int = 120
+    OPENAI_MAX_CONCURRENCY: int = 100
 
     CHAT_DATABASE_URL: str
 
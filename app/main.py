@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from slowapi.errors import RateLimitExceeded
 from sqlalchemy import text
 import logging
@@ -10,6 +10,8 @@ from .config import settings
 from .middlewares.rate_limiter import limiter, rate_limit_handler
 from .routers import auth, campaigns, creators
 from .database import engine, Base
+from helpers.metrics_helper import CONTENT_TYPE, render_metrics
+from .services.outbox_relay import outbox_relay
 # Import all models to ensure they are registered with SQLAlchemy
 from .models import *
 
@@ -57,6 +59,19 @@ async def startup_event():
             # Create database tables
             async with engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                # create_all skips indexes on tables that already exist
+                await conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_outreach_logs_recipient_contact ON outreach_logs (recipient_contact)"
+                ))
+                # sent_at used to default to the insert time; it is now set only when the send succeeds
+                await conn.execute(text("ALTER TABLE outreach_logs ALTER COLUMN sent_at DROP DEFAULT"))
+                # The assistant job goes with its campaign (tables created before had no ON DELETE)
+                await conn.execute(text(
+                    "ALTER TABLE campaign_assistants "
+                    "DROP CONSTRAINT IF EXISTS campaign_assistants_campaign_id_fkey, "
+                    "ADD CONSTRAINT campaign_assistants_campaign_id_fkey "
+                    "FOREIGN KEY (campaign_id) REFERENCES campaigns (id) ON DELETE CASCADE"
+                ))
             
             logger.info("Database tables created successfully")
             break
@@ -73,10 +88,14 @@ async def startup_event():
                 # Don't raise here to allow the app to start, but log the issue
                 # The health check endpoint will show the database status
 
+    # Publish queued outreach from committed transactions
+    outbox_relay.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down InfluenceFlow API...")
+    await outbox_relay.stop()
 
 @app.get("/")
 async def root():
@@ -109,6 +128,11 @@ async def health_check():
         
     return health_status
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (queue publish counters for this API process)"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 @app.get("/demo-run")
 async def demo_lifecycle():
     """Demo endpoint to simulate full campaign lifecycle"""
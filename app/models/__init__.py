@@ -8,6 +8,11 @@ from .negotiation import Negotiation
 from .contract import Contract
 from .performance_report import PerformanceReport
 from .payment import Payment
+from .outbox_message import OutboxMessage
+from .conversation_route import ConversationRoute
+from .campaign_assistant import CampaignAssistant
+from .chat_message import ChatMessage
+from .inbound_message import InboundWhatsAppMessage
 
 __all__ = [
     "User",
@@ -18,5 +23,10 @@ __all__ = [
     "Negotiation",
     "Contract",
     "PerformanceReport",
-    "Payment"
+    "Payment",
+    "OutboxMessage",
+    "ConversationRoute",
+    "CampaignAssistant",
+    "ChatMessage",
+    "InboundWhatsAppMessage"
 ]
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+class CampaignAssistant(Base):
+    """Provisioning job and result for a campaign's OpenAI assistant.
+
+    The API marks the row ``pending`` when a campaign changes; the WhatsApp
+    business service picks it up, renders the instructions and hashes them
+    with the model into ``config_hash``. An assistant with the same hash is
+    reused, one owned by this campaign alone is updated in place, and only
+    otherwise is a new one created.
+    """
+    __tablename__ = "campaign_assistants"
+    
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, ready, failed
+    config_hash = Column(String, nullable=True, index=True)
+    assistant_id = Column(String, nullable=True, index=True)
+    error = Column(Text, nullable=True)
+    
+    requested_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
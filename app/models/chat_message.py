@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+class ChatMessage(Base):
+    """Local copy of an OpenAI thread message.
+
+    The WhatsApp business service appends messages in thread order after
+    every assistant run (and on request), resuming from the thread's last
+    stored ``message_id``; ``seq`` keeps that order and is the pagination
+    cursor of the chat endpoint.
+    """
+    __tablename__ = "chat_messages"
+    
+    seq = Column(Integer, primary_key=True)
+    message_id = Column(String, nullable=False, unique=True)
+    thread_id = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False, default="")
+    created_at = Column(Integer, nullable=False)  # Unix seconds, as returned by OpenAI
+    
+    synced_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_chat_messages_thread_seq", "thread_id", "seq"),
+    )
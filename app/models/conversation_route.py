@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+class ConversationRoute(Base):
+    """Where an inbound WhatsApp message from ``mobile`` belongs.
+
+    Filled lazily by the WhatsApp business service from outreach_logs and
+    campaign_creators; rows are deleted (and a ``conversation_routes``
+    NOTIFY sent) whenever an invitation for the number changes, so the next
+    message rebuilds the route.
+    """
+    __tablename__ = "conversation_routes"
+    
+    mobile = Column(String, primary_key=True)
+    creator_id = Column(Integer, ForeignKey("creators.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, index=True)
+    campaign_creator_id = Column(Integer, ForeignKey("campaign_creators.id"), nullable=False, index=True)
+    assistant_id = Column(String, nullable=True)
+    thread_id = Column(String, nullable=True)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+class InboundWhatsAppMessage(Base):
+    """Inbound WhatsApp message accepted by the business service's webhook.
+
+    Stored before the provider is acked and marked ``processed_at`` once the
+    reply was sent, so accepted messages survive restarts; ``message_id`` is
+    the provider's id and drops its retries.
+    """
+    __tablename__ = "whatsapp_inbound_messages"
+    
+    id = Column(Integer, primary_key=True)
+    message_id = Column(String, nullable=True, unique=True)
+    mobile = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Keeps the workers' "next unprocessed batch" scan small
+        Index("ix_whatsapp_inbound_messages_unprocessed", "id", postgresql_where=processed_at.is_(None)),
+    )
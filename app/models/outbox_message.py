@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+class OutboxMessage(Base):
+    """Queue message written in the same transaction as the rows it refers to.
+
+    The outbox relay publishes unpublished rows to RabbitMQ and stamps
+    ``published_at``, so a message is enqueued if and only if its
+    transaction committed.
+    """
+    __tablename__ = "outbox_messages"
+    
+    id = Column(Integer, primary_key=True)
+    queue_name = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    priority = Column(Integer, nullable=False, default=5)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Keeps the relay's "next unpublished batch" scan small
+        Index("ix_outbox_messages_unpublished", "id", postgresql_where=published_at.is_(None)),
+    )
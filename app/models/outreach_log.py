@@ -1,5 +1,4 @@
 from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Boolean
-from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
 from ..database import Base
@@ -25,13 +24,13 @@ class OutreachLog(Base):
     
     # Outreach details
     outreach_type = Column(Enum(OutreachType), nullable=False)
-    recipient_contact = Column(String, nullable=False)  # email, phone, username
+    recipient_contact = Column(String, nullable=False, index=True)  # email, phone, username
     subject = Column(String, nullable=True)
     message = Column(Text, nullable=False)
     
     # Status and tracking
     status = Column(Enum(OutreachStatus), default=OutreachStatus.INITIATED)
-    sent_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)  # set by the consumers on send
     delivered_at = Column(DateTime(timezone=True), nullable=True)
     read_at = Column(DateTime(timezone=True), nullable=True)
     replied_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,31 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-import requests
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert
 from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Optional
 from datetime import datetime, UTC
 
-from helpers.queue_helper import create_queue
 from ..database import get_db
 from ..models.user import User
 from ..models.campaign import Campaign
 from ..models.campaign_creator import CampaignCreator
 from ..models.creator import Creator
+from ..models.campaign_assistant import CampaignAssistant
+from ..models.chat_message import ChatMessage
 from ..schemas.campaign import (
     CampaignCreate, 
     Campaign as CampaignSchema, 
     CampaignUpdate,
     CampaignCreatorCreate,
     CampaignCreator as CampaignCreatorSchema,
+    CampaignCreatorBulkCreate,
+    CampaignCreatorBulkResult,
     CampaignStatusUpdate,
+    CampaignAssistantStatus,
     PaymentRequest
 )
 from ..dependencies import get_current_user, require_role
 from ..middlewares.rate_limiter import limiter
 from ..services.email_service import email_service
+from ..services.outbox_relay import outbox_relay, enqueue_outbox_messages
+from ..services.conversation_routes import invalidate_conversation_routes
+from ..services.campaign_assistants import request_campaign_assistant
+from ..services.chat_history import request_chat_sync
 from sqlalchemy import text
-from app.models.outreach_log import OutreachLog
+from app.models.outreach_log import OutreachLog, OutreachType, OutreachStatus
 from app.config import settings
 
 import stripe
@@ -140,6 +147,8 @@ async def delete_campaign(
             detail="Campaign not found"
         )
     
+    # Routes reference the campaign; drop them (and tell the WhatsApp service) in the same transaction
+    await invalidate_conversation_routes(db, campaign_id=campaign.id)
     await db.delete(campaign)
     await db.commit()
     
@@ -197,7 +206,7 @@ async def invite_creator_to_campaign(
             detail="Creator already invited to this campaign"
         )
     
-    # Create invitation
+    # Create invitation, outreach logs and outbox entries in one transaction
     db_campaign_creator = CampaignCreator(
         campaign_id=campaign_id,
         creator_id=invitation.creator_id,
@@ -206,10 +215,8 @@ async def invite_creator_to_campaign(
     )
     
     db.add(db_campaign_creator)
-    await db.commit()
-    await db.refresh(db_campaign_creator)
+    await db.flush()
     
-    # Send invitation email
     campaign_details = {
         'description': campaign.description,
         'start_date': campaign.start_date,
@@ -223,29 +230,12 @@ async def invite_creator_to_campaign(
         "subject": "Campaign Invitation",
         "message": "new campaign invitation",
         "status": "initiated",
-        "sent_at": datetime.now(UTC),
-        "delivered_at": datetime.now(UTC)
+        # Set by the consumer once the message actually goes out
+        "sent_at": None
     }
     print(f"whatsapp outreach log with data: {outreach_log_ingest_data}")
-    db_outreach_log = OutreachLog(**outreach_log_ingest_data)
-    
-    db.add(db_outreach_log)
-    await db.commit()
-    await db.refresh(db_outreach_log)
-    outreach_id = db_outreach_log.id
-    _status = db_outreach_log.status
-    queue1 = create_queue(
-        queue_name=settings.WHATSAPP_QUEUE_NAME,
-        host=settings.RABBITMQ_HOST,
-        port=settings.RABBITMQ_PORT,
-        user=settings.RABBITMQ_USER,
-        password=settings.RABBITMQ_PASSWORD,
-        vhost=settings.RABBITMQ_VHOST
-    )
-    queue1.put({
-        "outreach_id": outreach_id,
-        "status": _status
-    })
+    whatsapp_outreach_log = OutreachLog(**outreach_log_ingest_data)
+
     outreach_data = await email_service.send_campaign_invitation(
         creator_email=creator.email,
         creator_name=creator.full_name,
@@ -262,36 +252,156 @@ async def invite_creator_to_campaign(
         "subject": outreach_data["subject"],
         "message": outreach_data["message"],
         "status": outreach_data["status"],
-        "sent_at": datetime.now(UTC),
-        "delivered_at": datetime.now(UTC)
+        "sent_at": None
     }
     print(f"Creating outreach log with data: {outreach_log_ingest_data}")
-    db_outreach_log = OutreachLog(**outreach_log_ingest_data)
-    
-    db.add(db_outreach_log)
+    email_outreach_log = OutreachLog(**outreach_log_ingest_data)
+
+    db.add_all([whatsapp_outreach_log, email_outreach_log])
+    await db.flush()
+
+    await enqueue_outbox_messages(db, settings.WHATSAPP_QUEUE_NAME, [{
+        "outreach_id": whatsapp_outreach_log.id,
+        "status": OutreachStatus.INITIATED,
+        # Consumers keep messages to the same recipient in order
+        "recipient_contact": whatsapp_outreach_log.recipient_contact
+    }])
+    # Ids and a template reference only; the email consumer renders the body
+    await enqueue_outbox_messages(db, settings.EMAIL_QUEUE_NAME, [{
+        "outreach_id": email_outreach_log.id,
+        "status": OutreachStatus.INITIATED,
+        "recipient_contact": email_outreach_log.recipient_contact,
+        "template": outreach_data["template"],
+        "template_version": outreach_data["template_version"]
+    }])
+    # Inbound WhatsApp from this number may now belong to the new invitation
+    await invalidate_conversation_routes(db, mobiles=[creator.phone_number])
+
     await db.commit()
-    await db.refresh(db_outreach_log)
+    outbox_relay.wake()
+    await db.refresh(db_campaign_creator)
 
-    outreach_id = db_outreach_log.id
-    _status = db_outreach_log.status
+    return db_campaign_creator
 
-    payload = {
-        "outreach_id": outreach_id,
-        "status": _status
-    }
 
-    print(f"Sending payload to email queue: {payload}")
-    queue = create_queue(
-        queue_name=settings.EMAIL_QUEUE_NAME,
-        host=settings.RABBITMQ_HOST,
-        port=settings.RABBITMQ_PORT,
-        user=settings.RABBITMQ_USER,
-        password=settings.RABBITMQ_PASSWORD,
-        vhost=settings.RABBITMQ_VHOST
+@router.post("/{campaign_id}/invite/bulk", response_model=CampaignCreatorBulkResult)
+@limiter.limit("5/minute")
+async def invite_creators_to_campaign(
+    campaign_id: int,
+    request: Request,
+    bulk: CampaignCreatorBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Invite many creators to a campaign in one transaction"""
+    result = await db.execute(
+        select(Campaign)
+        .filter(Campaign.id == campaign_id, Campaign.user_id == current_user.id)
     )
-    queue.put(payload)
+    campaign = result.scalar_one_or_none()
+    
+    if not campaign:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Campaign not found"
+        )
+    
+    # Last entry wins if a creator is listed twice
+    invitations = {invitation.creator_id: invitation for invitation in bulk.invitations}
+    creator_ids = list(invitations)
 
-    return db_campaign_creator
+    # Validate every creator and find existing invitations with one query each
+    result = await db.execute(
+        select(Creator.id, Creator.email, Creator.phone_number)
+        .filter(Creator.id.in_(creator_ids))
+    )
+    creators = {row.id: row for row in result}
+    result = await db.execute(
+        select(CampaignCreator.creator_id)
+        .filter(
+            CampaignCreator.campaign_id == campaign_id,
+            CampaignCreator.creator_id.in_(creator_ids)
+        )
+    )
+    already_invited = set(result.scalars().all())
+
+    not_found = [creator_id for creator_id in creator_ids if creator_id not in creators]
+    to_invite = [
+        creator_id for creator_id in creator_ids
+        if creator_id in creators and creator_id not in already_invited
+    ]
+    if not to_invite:
+        return CampaignCreatorBulkResult(invited=[], already_invited=sorted(already_invited), not_found=not_found)
+
+    # Multi-row inserts, one transaction
+    result = await db.execute(
+        insert(CampaignCreator).returning(CampaignCreator),
+        [
+            {
+                "campaign_id": campaign_id,
+                "creator_id": creator_id,
+                "offered_rate": invitations[creator_id].offered_rate,
+                "deliverables_total": invitations[creator_id].deliverables_total,
+            }
+            for creator_id in to_invite
+        ]
+    )
+    campaign_creators = result.scalars().all()
+
+    # Every invitation shares the subject and template reference; bodies are rendered by the consumer
+    invitation_email = email_service.campaign_invitation_outreach(campaign.title, campaign.brand_name)
+    outreach_rows = []
+    for cc in campaign_creators:
+        creator = creators[cc.creator_id]
+        if creator.phone_number:
+            outreach_rows.append({
+                "campaign_creator_id": cc.id,
+                "outreach_type": OutreachType.WHATSAPP,
+                "recipient_contact": creator.phone_number,
+                "subject": "Campaign Invitation",
+                "message": "new campaign invitation",
+                "status": OutreachStatus.INITIATED,
+                "sent_at": None,
+            })
+        if creator.email:
+            outreach_rows.append({
+                "campaign_creator_id": cc.id,
+                "outreach_type": OutreachType.EMAIL,
+                "recipient_contact": creator.email,
+                "subject": invitation_email["subject"],
+                "message": invitation_email["message"],
+                "status": OutreachStatus.INITIATED,
+                "sent_at": None,
+            })
+    result = await db.execute(
+        insert(OutreachLog).returning(OutreachLog.id, OutreachLog.outreach_type, OutreachLog.recipient_contact),
+        outreach_rows
+    )
+    outreach_logs = result.all()
+
+    payloads = {OutreachType.EMAIL: [], OutreachType.WHATSAPP: []}
+    for outreach in outreach_logs:
+        payload = {
+            "outreach_id": outreach.id,
+            "status": OutreachStatus.INITIATED,
+            "recipient_contact": outreach.recipient_contact
+        }
+        if outreach.outreach_type == OutreachType.EMAIL:
+            payload["template"] = invitation_email["template"]
+            payload["template_version"] = invitation_email["template_version"]
+        payloads[outreach.outreach_type].append(payload)
+    # Published in batches by the outbox relay once this transaction commits
+    await enqueue_outbox_messages(db, settings.EMAIL_QUEUE_NAME, payloads[OutreachType.EMAIL])
+    await enqueue_outbox_messages(db, settings.WHATSAPP_QUEUE_NAME, payloads[OutreachType.WHATSAPP])
+    await invalidate_conversation_routes(db, mobiles=[creators[creator_id].phone_number for creator_id in to_invite])
+    await db.commit()
+    outbox_relay.wake()
+
+    return CampaignCreatorBulkResult(
+        invited=campaign_creators,
+        already_invited=sorted(already_invited),
+        not_found=not_found
+    )
 
 
 @router.get("/{campaign_id}/creators", response_model=List[CampaignCreatorSchema])
@@ -346,44 +456,47 @@ async def edit_campaign(
         )
     
     # Update campaign fields
-    
-    assistant_id = None
-    try:
-        assistant_id_url = f"http://localhost:8001/create-campaign-assistant"
-        response = requests.post(url=assistant_id_url, json={
-  "id": campaign_id,
-  "title": campaign.title,
-  "description": f"{campaign.description} brand_name: {campaign.brand_name} campaign_type: {campaign.campaign_type} start_date: {campaign.start_date} end_date: {campaign.end_date} target_audience: {campaign.target_audience.get("value")} deliverables: {campaign.deliverables.get("value")} You are an good outreach agent with good negotiation skills. You are able to negotiate with creators and close deals with them. You are able to answer questions related to the campaign and negotiate prices within the budget.",
-  "budget": campaign.budget
-})
-        print(response.text)
-
-        response.raise_for_status()
-        response = response.json()
-        assistant_id = response["assistant_id"]
-    except Exception as e:
-        print(f"Error getting assitant id")
-        raise e
-    
-
     update_data = campaign_status_update.dict(exclude_unset=True)
-    update_data["assistant_id"] = assistant_id
     print(update_data)
     for field, value in update_data.items():
         setattr(campaign, field, value)
-    
+
+    # The WhatsApp business service provisions (or reuses) the assistant in the background
+    await request_campaign_assistant(db, campaign_id)
     await db.commit()
-    await db.refresh(campaign)
     
     return {
-        "status": True
+        "status": True,
+        "assistant_status": "pending"
     }
 
 
+@router.get("/{campaign_id}/assistant", response_model=CampaignAssistantStatus)
+async def get_campaign_assistant_status(campaign_id: int, db: AsyncSession = Depends(get_db)):
+    """Provisioning status of the campaign's assistant"""
+    result = await db.execute(
+        select(CampaignAssistant).filter(CampaignAssistant.campaign_id == campaign_id)
+    )
+    campaign_assistant = result.scalar_one_or_none()
+
+    if not campaign_assistant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No assistant requested for this campaign"
+        )
+    return campaign_assistant
+
+
 @router.get("/creator/{creator_id}/campaign/{campaign_id}/chat")
-async def get_creator_campaign_chat(creator_id: int, campaign_id: int,db: AsyncSession = Depends(get_db)):
+async def get_creator_campaign_chat(
+        creator_id: int,
+        campaign_id: int,
+        before: Optional[int] = Query(None, description="Cursor from next_before to load older messages"),
+        limit: int = Query(50, ge=1, le=200),
+        db: AsyncSession = Depends(get_db)
+    ):
     """
-    Fetch chat messages for a specific creator and campaign
+    Fetch chat messages for a specific creator and campaign, newest page first
     """
     try:
         # Get thread_id from database
@@ -393,7 +506,7 @@ async def get_creator_campaign_chat(creator_id: int, campaign_id: int,db: AsyncS
         )
         row = result.mappings().fetchone()
         
-        if not row["thread_id"]:
+        if not row or not row["thread_id"]:
             return {
                 "creator_id": creator_id,
                 "campaign_id": campaign_id,
@@ -402,50 +515,42 @@ async def get_creator_campaign_chat(creator_id: int, campaign_id: int,db: AsyncS
                 "total_messages": []
             }
         
-        thread_id = row.thread_id
+        thread_id = row["thread_id"]
         
-        # Fetch messages from OpenAI
-        messages_response = requests.get(f"https://api.openai.com/v1/threads/{thread_id}/messages",
-            headers={
-                "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                "OpenAI-Beta": "assistants=v2"
-            }
-        )
-        
-        if messages_response.status_code != 200:
-            raise HTTPException(
-                status_code=messages_response.status_code, 
-                detail=f"Failed to fetch messages: {messages_response.text}"
-            )
-            
-        messages = messages_response.json()
+        # Served from the local store kept in sync by the WhatsApp business service
+        query = select(ChatMessage).filter(ChatMessage.thread_id == thread_id)
+        if before is not None:
+            query = query.filter(ChatMessage.seq < before)
+        result = await db.execute(query.order_by(ChatMessage.seq.desc()).limit(limit + 1))
+        page = result.scalars().all()
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        if not page and before is None:
+            # Thread not synced yet (e.g. older than the store); it shows up on a later refresh
+            await request_chat_sync(db, thread_id)
+            await db.commit()
         
         # Format messages in chronological order (oldest first)
-        formatted_messages = []
-        for message in reversed(messages.get("data", [])):
-            formatted_message = {
-                "id": message.get("id"),
-                "role": message.get("role"),
-                "content": "",
-                "created_at": message.get("created_at"),
-                "timestamp": message.get("created_at")
+        formatted_messages = [
+            {
+                "id": message.message_id,
+                "role": message.role,
+                "content": message.content,
+                "created_at": message.created_at,
+                "timestamp": message.created_at
             }
-            
-            # Extract text content
-            content_parts = []
-            for content_block in message.get("content", []):
-                if content_block.get("type") == "text":
-                    content_parts.append(content_block.get("text", {}).get("value", ""))
-            
-            formatted_message["content"] = " ".join(content_parts)
-            formatted_messages.append(formatted_message)
+            for message in reversed(page)
+        ]
         
         return {
             "creator_id": creator_id,
             "campaign_id": campaign_id,
             "thread_id": thread_id,
             "messages": formatted_messages,
-            "total_messages": len(formatted_messages)
+            "total_messages": len(formatted_messages),
+            "has_more": has_more,
+            "next_before": page[-1].seq if has_more else None
         }
         
     except HTTPException:
@@ -15,6 +15,7 @@ from ..schemas.creator import (
 from ..dependencies import get_current_user, get_current_creator
 from ..middlewares.rate_limiter import limiter
 from ..services.pinecone_service import PineconeService
+from ..services.conversation_routes import invalidate_conversation_routes
 pinecone_service = PineconeService()
 router = APIRouter(prefix="/creators", tags=["creators"])
 
@@ -274,6 +275,8 @@ async def decline_campaign_invitation(
     
     # Update status
     campaign_creator.status = "declined"
+    # Stop routing this creator's WhatsApp messages to the declined campaign
+    await invalidate_conversation_routes(db, campaign_creator_ids=[campaign_creator.id])
     
     await db.commit()
     
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -86,9 +86,33 @@ class CampaignCreator(CampaignCreatorBase):
     class Config:
         from_attributes = True
 
+class CampaignCreatorInvite(BaseModel):
+    creator_id: int
+    offered_rate: float
+    deliverables_total: int
+
+class CampaignCreatorBulkCreate(BaseModel):
+    invitations: List[CampaignCreatorInvite] = Field(..., min_length=1, max_length=1000)
+
+class CampaignCreatorBulkResult(BaseModel):
+    invited: List[CampaignCreator]
+    already_invited: List[int] = []
+    not_found: List[int] = []
+
 class CampaignStatusUpdate(BaseModel):
     status: str
 
+class CampaignAssistantStatus(BaseModel):
+    campaign_id: int
+    status: str  # pending, running, ready, failed
+    assistant_id: Optional[str] = None
+    error: Optional[str] = None
+    requested_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class PaymentRequest(BaseModel):
     amount: int
     id: str  # payment_method_id from Stripe
@@ -0,0 +1,26 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# LISTEN channel of the WhatsApp business service's assistant worker; payload is a campaign id
+CAMPAIGN_ASSISTANTS_CHANNEL = "campaign_assistants"
+
+
+async def request_campaign_assistant(db: AsyncSession, campaign_id: int) -> None:
+    """Queue (re)provisioning of the campaign's assistant, inside the caller's transaction.
+
+    The worker is notified on commit; if the rendered instructions did not
+    change, the job finishes without calling OpenAI.
+    """
+    await db.execute(
+        text("""
+            insert into campaign_assistants (campaign_id, status, requested_at, updated_at)
+            values (:campaign_id, 'pending', now(), now())
+            on conflict (campaign_id) do update set
+                status = 'pending', error = null, requested_at = now(), updated_at = now()
+        """),
+        {"campaign_id": campaign_id}
+    )
+    await db.execute(
+        text("select pg_notify(:channel, cast(:campaign_id as text))"),
+        {"channel": CAMPAIGN_ASSISTANTS_CHANNEL, "campaign_id": campaign_id}
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# LISTEN channel of the WhatsApp business service's chat history sync; payload is a thread id
+CHAT_SYNC_CHANNEL = "chat_sync"
+
+
+async def request_chat_sync(db: AsyncSession, thread_id: str) -> None:
+    """Ask the WhatsApp business service to pull new messages of a thread once the caller commits"""
+    await db.execute(
+        text("select pg_notify(:channel, :thread_id)"),
+        {"channel": CHAT_SYNC_CHANNEL, "thread_id": thread_id}
+    )
@@ -0,0 +1,46 @@
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# LISTEN channel of the WhatsApp business service's route cache; payload is a mobile number or "*"
+CONVERSATION_ROUTES_CHANNEL = "conversation_routes"
+
+
+async def invalidate_conversation_routes(
+    db: AsyncSession,
+    mobiles: Iterable[str] = (),
+    campaign_creator_ids: Iterable[int] = (),
+    campaign_id: int = None
+) -> None:
+    """Drop the routes affected by an invitation change, inside the caller's transaction.
+
+    The NOTIFY is delivered when the transaction commits, so the WhatsApp
+    service never caches a route that was rolled back or is about to change.
+    """
+    mobiles = {mobile for mobile in mobiles if mobile}
+    campaign_creator_ids = list(campaign_creator_ids)
+    if campaign_creator_ids:
+        result = await db.execute(
+            text("delete from conversation_routes where campaign_creator_id = any(:ids) returning mobile"),
+            {"ids": campaign_creator_ids}
+        )
+        mobiles.update(result.scalars().all())
+    if mobiles:
+        await db.execute(
+            text("delete from conversation_routes where mobile = any(:mobiles)"),
+            {"mobiles": list(mobiles)}
+        )
+        await db.execute(
+            text("select pg_notify(:channel, mobile) from unnest(cast(:mobiles as text[])) as mobile"),
+            {"channel": CONVERSATION_ROUTES_CHANNEL, "mobiles": list(mobiles)}
+        )
+    if campaign_id is not None:
+        await db.execute(
+            text("delete from conversation_routes where campaign_id = :campaign_id"),
+            {"campaign_id": campaign_id}
+        )
+        await db.execute(
+            text("select pg_notify(:channel, '*')"),
+            {"channel": CONVERSATION_ROUTES_CHANNEL}
+        )
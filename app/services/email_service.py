@@ -1,22 +1,144 @@
 import aiosmtplib
+import asyncio
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from jinja2 import Template
 from typing import Dict, Any, Optional
 import logging
+from uuid import uuid4
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.models.outreach_log import OutreachStatus
-from helpers.queue_helper import create_queue
+from helpers.token_bucket_helper import TokenBucket
+from app.services.template_registry import template_registry, template_reference
+from app.services.outbox_relay import enqueue_outbox_messages
+from helpers.queue_helper import MessagePriority
 from app.models.outreach_log import OutreachStatus
 
 logger = logging.getLogger(__name__)
 
+CAMPAIGN_INVITATION_TEMPLATE = "email/campaign_invitation"
+CONTRACT_NOTIFICATION_TEMPLATE = "email/contract_notification"
+PAYMENT_NOTIFICATION_TEMPLATE = "email/payment_notification"
+
+# Email queue payloads that carry a rendered-at-send notification instead of an outreach id
+NOTIFICATION_KIND = "notification"
+
+
+class _PooledSMTPConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """Authenticated SMTP connections reused across messages.
+
+    Each send checks out a connection that has already done TCP connect,
+    STARTTLS and AUTH, so it only costs the MAIL/RCPT/DATA transaction.
+    Connections are recycled after ``max_messages_per_connection`` sends,
+    after sitting idle for ``idle_timeout`` seconds, or on any error.
+    """
+
+    def __init__(self, hostname, port, username, password, size=5,
+                 max_messages_per_connection=100, idle_timeout=60, timeout=30):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def send_message(self, message):
+        async with self._slots:
+            connection, reused = await self._checkout()
+            try:
+                await connection.smtp.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                await self._discard(connection)
+                if not reused:
+                    raise
+                # The server dropped an idle connection; retry once on a fresh one
+                connection, _ = await self._checkout(fresh=True)
+                try:
+                    await connection.smtp.send_message(message)
+                except Exception:
+                    await self._discard(connection)
+                    raise
+            except Exception:
+                await self._discard(connection)
+                raise
+            await self._checkin(connection)
+
+    async def close(self):
+        while self._idle:
+            await self._discard(self._idle.pop())
+
+    async def _checkout(self, fresh=False):
+        while self._idle and not fresh:
+            connection = self._idle.pop()
+            idle_for = time.monotonic() - connection.last_used
+            if connection.smtp.is_connected and idle_for < self.idle_timeout:
+                return connection, True
+            await self._discard(connection)
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            start_tls=True,
+            username=self.username,
+            password=self.password,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        return _PooledSMTPConnection(smtp), False
+
+    async def _checkin(self, connection):
+        connection.messages_sent += 1
+        connection.last_used = time.monotonic()
+        if connection.messages_sent >= self.max_messages_per_connection:
+            await self._discard(connection)
+        else:
+            self._idle.append(connection)
+
+    async def _discard(self, connection):
+        try:
+            if connection.smtp.is_connected:
+                await connection.smtp.quit()
+        except Exception:
+            connection.smtp.close()
+
+
 class EmailService:
     def __init__(self):
         self.smtp_host = settings.SMTP_HOST
         self.smtp_port = settings.SMTP_PORT
         self.smtp_username = settings.SMTP_USERNAME
         self.smtp_password = settings.SMTP_PASSWORD
+        self.smtp_pool = SMTPConnectionPool(
+            hostname=self.smtp_host,
+            port=self.smtp_port,
+            username=self.smtp_username,
+            password=self.smtp_password,
+            size=settings.SMTP_POOL_SIZE,
+            max_messages_per_connection=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+            idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+        )
+        self.rate_limiter = TokenBucket(
+            settings.REDIS_URL,
+            name=f"smtp:{self.smtp_username}",
+            rate=settings.SMTP_SEND_RATE_PER_SECOND,
+            capacity=settings.SMTP_SEND_BURST,
+        )
+
+    async def close(self):
+        """Close pooled SMTP connections"""
+        await self.smtp_pool.close()
+        await self.rate_limiter.close()
     
     async def send_email(
         self,
@@ -45,15 +167,9 @@ class EmailService:
             else:
                 message.attach(MIMEText(body, "plain"))
             
-            # Send email
-            await aiosmtplib.send(
-                message,
-                hostname=self.smtp_host,
-                port=self.smtp_port,
-                start_tls=True,
-                username=self.smtp_username,
-                password=self.smtp_password,
-            )
+            # Wait for the account's send budget, then reuse a pooled connection
+            await self.rate_limiter.acquire()
+            await self.smtp_pool.send_message(message)
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
@@ -62,6 +178,20 @@ class EmailService:
             logger.error(f"Failed to send email to {to_email}: {e}")
             return False
     
+    def campaign_invitation_outreach(self, campaign_title: str, brand_name: str) -> Dict[str, Any]:
+        """Subject and template reference of a campaign invitation.
+
+        The body is not rendered here: the email consumer renders the
+        referenced template version at send time.
+        """
+        version = template_registry.latest_version(CAMPAIGN_INVITATION_TEMPLATE)
+        return {
+            "subject": f"Collaboration Opportunity: {campaign_title} - {brand_name}",
+            "message": template_reference(CAMPAIGN_INVITATION_TEMPLATE, version),
+            "template": CAMPAIGN_INVITATION_TEMPLATE,
+            "template_version": version,
+        }
+
     async def send_campaign_invitation(
         self,
         creator_email: str,
@@ -71,133 +201,84 @@ class EmailService:
         offered_rate: float,
         campaign_details: Dict[str, Any]
     ) -> bool:
-        """Send campaign invitation email to creator"""
-        
-        template = Template("""
-        Hi {{ creator_name }},
-
-        We hope this email finds you well! We're reaching out from {{ brand_name }} with an exciting collaboration opportunity.
-
-        Campaign: {{ campaign_title }}
-        Offered Rate: ${{ offered_rate }}
-
-        Campaign Details:
-        {{ campaign_description }}
-
-        We believe your content style and audience would be a perfect fit for this campaign. 
-
-        If you're interested, please reply to this email or log into your InfluenceFlow dashboard to accept the invitation.
-
-        Looking forward to working with you!
-
-        Best regards,
-        The {{ brand_name }} Team
-        """)
-        
-        body = template.render(
-            creator_name=creator_name,
-            brand_name=brand_name,
-            campaign_title=campaign_title,
-            offered_rate=offered_rate,
-            campaign_description=campaign_details.get('description', 'Please check your dashboard for full details.')
-        )
-        
-        subject = f"Collaboration Opportunity: {campaign_title} - {brand_name}"
-        queue_payload = {
-            "email": creator_email,
-            "subject": subject,
-            "body": body,
-        }
-        await self.send_campaign_invitation_to_queue(queue_payload)
+        """Build the campaign invitation outreach for a creator; the caller queues it through the outbox"""
+        outreach = self.campaign_invitation_outreach(campaign_title, brand_name)
 
         response = {
             "outreach_type": "email",
             "recipient_contact": creator_email,
-            "subject": subject,
-            "message": body,
             "status": "INITIATED",
+            **outreach,
         }
         return response
 
 
+    def notification_payload(self, creator_email: str, subject: str, template: str, **context: Any) -> Dict[str, Any]:
+        """Email queue payload for a notification; the consumer renders ``template`` at send time"""
+        return {
+            "kind": NOTIFICATION_KIND,
+            "notification_id": uuid4().hex,
+            "recipient_contact": creator_email,
+            "subject": subject,
+            "template": template,
+            "template_version": template_registry.latest_version(template),
+            "context": context,
+        }
+
+    async def queue_notification(self, db: AsyncSession, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a notification to the caller's transaction at transactional priority.
+
+        It is published once the caller commits (call ``outbox_relay.wake()``
+        after the commit), ahead of any invitation backlog on the email queue.
+        """
+        await enqueue_outbox_messages(
+            db, settings.EMAIL_QUEUE_NAME, [payload], priority=MessagePriority.TRANSACTIONAL
+        )
+        return payload
+
     async def send_contract_notification(
         self,
+        db: AsyncSession,
         creator_email: str,
         creator_name: str,
         campaign_title: str,
         contract_url: str
-    ) -> bool:
-        """Send contract signing notification"""
+    ) -> Dict[str, Any]:
+        """Queue contract signing notification"""
         
-        template = Template("""
-        Hi {{ creator_name }},
-
-        Great news! Your contract for the {{ campaign_title }} campaign is ready for signing.
-
-        Please review and sign your contract here: {{ contract_url }}
-
-        Once signed, we can proceed with the campaign kickoff.
-
-        Best regards,
-        InfluenceFlow Team
-        """)
-        
-        body = template.render(
+        payload = self.notification_payload(
+            creator_email,
+            f"Contract Ready for Signing - {campaign_title}",
+            CONTRACT_NOTIFICATION_TEMPLATE,
             creator_name=creator_name,
             campaign_title=campaign_title,
             contract_url=contract_url
         )
         
-        subject = f"Contract Ready for Signing - {campaign_title}"
-        
-        return await self.send_email(creator_email, subject, body)
+        return await self.queue_notification(db, payload)
     
     async def send_payment_notification(
         self,
+        db: AsyncSession,
         creator_email: str,
         creator_name: str,
         payment_amount: float,
         payment_type: str,
         campaign_title: str
-    ) -> bool:
-        """Send payment notification"""
+    ) -> Dict[str, Any]:
+        """Queue payment notification"""
         
-        template = Template("""
-        Hi {{ creator_name }},
-
-        Good news! Your {{ payment_type }} payment of ${{ payment_amount }} for the {{ campaign_title }} campaign has been processed.
-
-        You should see the payment in your account within 1-3 business days.
-
-        Thank you for your amazing work on this campaign!
-
-        Best regards,
-        InfluenceFlow Team
-        """)
-        
-        body = template.render(
+        payload = self.notification_payload(
+            creator_email,
+            f"Payment Processed - ${payment_amount} for {campaign_title}",
+            PAYMENT_NOTIFICATION_TEMPLATE,
             creator_name=creator_name,
             payment_amount=payment_amount,
             payment_type=payment_type,
             campaign_title=campaign_title
         )
         
-        subject = f"Payment Processed - ${payment_amount} for {campaign_title}"
-        
-        return await self.send_email(creator_email, subject, body)
-    
-    async def send_campaign_invitation_to_queue(self, payload):
-        print(f"Sending data to campaign invitation queue: {payload}")
-        queue = create_queue(
-            queue_name=settings.EMAIL_QUEUE_NAME,
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            user=settings.RABBITMQ_USER,
-            password=settings.RABBITMQ_PASSWORD,
-            vhost=settings.RABBITMQ_VHOST
-        )
-        queue.put(payload)
-        return True
+        return await self.queue_notification(db, payload)
 
 
 # Global instance
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from itertools import groupby
+from typing import Any, Dict, Iterable
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.outbox_message import OutboxMessage
+from helpers.poller_helper import Poller
+from helpers.queue_helper import create_queue, MessagePriority, PublishError
+
+logger = logging.getLogger(__name__)
+
+
+async def enqueue_outbox_messages(
+    db: AsyncSession,
+    queue_name: str,
+    payloads: Iterable[Dict[str, Any]],
+    priority: int = MessagePriority.BULK
+) -> None:
+    """Add queue messages to the caller's transaction; they are published once it commits"""
+    rows = [
+        {"queue_name": queue_name, "payload": payload, "priority": int(priority)}
+        for payload in payloads
+    ]
+    if rows:
+        await db.execute(insert(OutboxMessage), rows)
+
+
+class OutboxRelay(Poller):
+    """Publishes committed outbox rows to RabbitMQ in batches.
+
+    Each round locks up to ``batch_size`` unpublished rows with
+    ``FOR UPDATE SKIP LOCKED`` (so several API processes can relay side by
+    side), publishes them grouped by queue and priority over one connection
+    per group, and marks what the broker confirmed in the same transaction.
+    A crash between publish and commit republishes the batch; consumers
+    deduplicate by outreach id. Published rows are purged after ``retention_hours``.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size=500, poll_interval=1.0, retention_hours=24):
+        super().__init__(poll_interval=poll_interval)
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.retention_hours = retention_hours
+        self._queues = {}
+        self._rounds = 0
+
+    async def run_once(self):
+        published = await self.relay_batch()
+        self._rounds += 1
+        if self._rounds % 600 == 0:
+            await self.purge()
+        return published >= self.batch_size
+
+    async def relay_batch(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(text("""
+                select id, queue_name, payload, priority from outbox_messages
+                where published_at is null
+                order by id
+                limit :limit
+                for update skip locked
+            """), {"limit": self.batch_size})
+            rows = result.all()
+            if not rows:
+                await db.rollback()
+                return 0
+
+            published_ids = []
+            # Stable sort: one publish per queue and priority, id order kept inside each
+            group_key = lambda row: (row.queue_name, row.priority)
+            for (queue_name, priority), group in groupby(sorted(rows, key=group_key), key=group_key):
+                group = list(group)
+                try:
+                    sent = await asyncio.to_thread(
+                        self._publish, queue_name, [row.payload for row in group], priority
+                    )
+                except PublishError as e:
+                    # The rest stays unpublished and is retried next round
+                    logger.error(f"Outbox relay: {e}")
+                    sent = e.sent
+                # put_many confirms in order, so the first `sent` rows reached the broker
+                published_ids.extend(row.id for row in group[:sent])
+
+            if published_ids:
+                await db.execute(
+                    text("update outbox_messages set published_at = now() where id = any(:ids)"),
+                    {"ids": published_ids}
+                )
+            await db.commit()
+            return len(published_ids)
+
+    async def purge(self):
+        async with self.session_factory() as db:
+            await db.execute(
+                text("delete from outbox_messages where published_at < now() - make_interval(hours => :hours)"),
+                {"hours": self.retention_hours}
+            )
+            await db.commit()
+
+    def _publish(self, queue_name, payloads, priority):
+        # Runs in a worker thread: pika connections are blocking
+        return self._queue(queue_name).put_many(payloads, priority=priority)
+
+    def _queue(self, queue_name):
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            queue = self._queues[queue_name] = create_queue(
+                queue_name=queue_name,
+                host=settings.RABBITMQ_HOST,
+                port=settings.RABBITMQ_PORT,
+                user=settings.RABBITMQ_USER,
+                password=settings.RABBITMQ_PASSWORD,
+                vhost=settings.RABBITMQ_VHOST
+            )
+        return queue
+
+
+# Global instance, started with the API
+outbox_relay = OutboxRelay(
+    batch_size=settings.OUTBOX_RELAY_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_RELAY_POLL_INTERVAL,
+    retention_hours=settings.OUTBOX_RETENTION_HOURS,
+)
@@ -0,0 +1,90 @@
+import os
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+# <name>.v<version>.<ext>, e.g. email/campaign_invitation.v1.txt
+_TEMPLATE_FILE = re.compile(r"^(?P<name>.+)\.v(?P<version>\d+)\.(txt|html)$")
+# Stored instead of a rendered body, e.g. template:email/campaign_invitation@1
+_TEMPLATE_REFERENCE = re.compile(r"^template:(?P<name>[\w/.-]+)@(?P<version>\d+)$")
+
+
+def template_reference(name: str, version: int) -> str:
+    return f"template:{name}@{version}"
+
+
+def parse_template_reference(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Return ``(name, version)`` if ``value`` is a template reference, else None"""
+    match = _TEMPLATE_REFERENCE.match(value or "")
+    if not match:
+        return None
+    return match["name"], int(match["version"])
+
+
+class TemplateRegistry:
+    """Compiled, versioned message templates.
+
+    Templates live as files named ``<name>.v<version>.txt`` under the template
+    directory. Each one is parsed and compiled once per process and kept by
+    the Jinja environment; the bytecode cache lets new processes skip
+    compilation too. Rendering without a version uses the latest one, and
+    ``render_many`` renders one template for a whole batch of recipients.
+    """
+
+    def __init__(self, template_dir: str = DEFAULT_TEMPLATE_DIR, bytecode_cache_dir: Optional[str] = None):
+        self.template_dir = template_dir
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir) if bytecode_cache_dir else FileSystemBytecodeCache(),
+            keep_trailing_newline=True,
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self.paths: Dict[Tuple[str, int], str] = {}
+        self.versions: Dict[str, List[int]] = {}
+        self._discover()
+
+    def _discover(self):
+        for path in self.env.list_templates():
+            match = _TEMPLATE_FILE.match(path)
+            if match:
+                name, version = match["name"], int(match["version"])
+                self.paths[(name, version)] = path
+                self.versions.setdefault(name, []).append(version)
+        for name in self.versions:
+            self.versions[name].sort()
+        logger.info(f"Loaded {len(self.versions)} message template(s) from {self.template_dir}")
+
+    def latest_version(self, name: str) -> int:
+        if name not in self.versions:
+            raise KeyError(f"Unknown template '{name}'")
+        return self.versions[name][-1]
+
+    def get(self, name: str, version: Optional[int] = None) -> Tuple[Template, int]:
+        """Return the compiled template and the version it resolved to."""
+        version = version or self.latest_version(name)
+        path = self.paths.get((name, version))
+        if path is None:
+            raise KeyError(f"Unknown version {version} of template '{name}'")
+        return self.env.get_template(path), version
+
+    def render(self, name: str, version: Optional[int] = None, **context: Any) -> str:
+        template, _ = self.get(name, version)
+        return template.render(**context)
+
+    def render_many(self, name: str, contexts: Iterable[Dict[str, Any]], version: Optional[int] = None) -> List[str]:
+        """Render one template for many recipients, resolving and compiling it once."""
+        template, _ = self.get(name, version)
+        return [template.render(**context) for context in contexts]
+
+
+# Global instance
+template_registry = TemplateRegistry(bytecode_cache_dir=settings.TEMPLATE_BYTECODE_CACHE_DIR)
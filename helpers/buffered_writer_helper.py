@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """Write-behind buffer flushed to the database in batches.
+
+    Subclasses call ``_buffer(key, value)`` from their ``record`` methods and
+    implement ``_write(rows)`` for a ``{key: value}`` batch. Values buffered
+    for the same key are combined with ``_merge`` (the newest one wins by
+    default). A flush runs every ``flush_interval`` seconds, or as soon as
+    ``max_rows`` keys are buffered; rows of a failed flush are kept and
+    retried with the next one.
+    """
+
+    def __init__(self, max_rows=200, flush_interval=0.2):
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flusher = None
+        self._flushes = set()
+        self._lock = asyncio.Lock()
+        self._closing = asyncio.Event()
+
+    def _buffer(self, key, value):
+        self._pending[key] = self._merge(self._pending.get(key), value)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+        if len(self._pending) >= self.max_rows:
+            # Keep a reference so the flush can't be garbage-collected mid-write
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    @staticmethod
+    def _merge(current, update):
+        return update
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return 0
+            rows, self._pending = self._pending, {}
+            try:
+                await self._write(rows)
+            except BaseException as e:
+                # Put the batch back (also when cancelled mid-write) so nothing is lost;
+                # anything recorded since the swap is newer and goes on top
+                for key, value in self._pending.items():
+                    rows[key] = self._merge(rows.get(key), value)
+                self._pending = rows
+                if not isinstance(e, Exception):
+                    raise
+                logger.error(f"{type(self).__name__} failed to write {len(rows)} row(s): {e}")
+                return 0
+            return len(rows)
+
+    async def close(self):
+        # Let a flush that is already writing finish rather than cancelling it
+        self._closing.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        await asyncio.gather(*self._flushes)
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    async def _write(self, rows):
+        raise NotImplementedError
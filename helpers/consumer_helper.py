@@ -0,0 +1,255 @@
+import time
+import signal
+import asyncio
+import logging
+from collections import deque
+
+from helpers.queue_helper import AsyncQueueReader
+from helpers.metrics_helper import (
+    CONSUMER_IN_FLIGHT,
+    QUEUE_MESSAGES_CONSUMED,
+    QUEUE_PROCESSING_SECONDS,
+    start_metrics_server,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def recipient_key(payload):
+    """Ordering key for outreach messages: everything sent to one contact stays in order."""
+    return payload.get("recipient_contact") or payload.get("outreach_id")
+
+
+class QueueConsumer:
+    """Long-running consumer shared by every outreach channel.
+
+    A channel only supplies ``handler(payload)``, an async function whose
+    return value decides what happens to the delivery:
+
+    - ``True``: handled, the delivery is acked
+    - ``False`` (or an exception): failed, the delivery goes through the
+      queue's retry policy
+    - ``None``: nothing to do for this payload, the delivery is acked
+
+    Channels that can share work across messages (one DB round trip for many
+    rows) pass ``batch_handler(payloads)`` instead, returning one such result
+    per payload; deliveries are then grouped into batches of up to
+    ``batch_size`` that arrive within ``batch_linger`` seconds.
+
+    With an ``ordering_key(payload)`` (e.g. the recipient), messages with the
+    same key are handled strictly one after another: a delivery whose key is
+    already in flight waits behind it, everything else goes out in the same
+    batch as before. When a batch finishes, the next waiting message of each
+    of its keys is handled together as the follow-up batch (still at most
+    one message per key). A message that goes to the retry queue leaves the
+    sequence, so ordering holds for first attempts only, and only within
+    this process: other consumers of the same queue are not coordinated.
+
+    ``on_dead_letter(payload)``, if given, is awaited for a delivery that
+    failed for the last time (dead-lettered, or dropped without a retry
+    policy), e.g. to record a permanent failure; transient failures that are
+    retried don't reach it.
+
+    The consumer owns the RabbitMQ connection (reconnecting on failure),
+    caps concurrency through the prefetch count, exports metrics, answers
+    ``/health`` next to ``/metrics`` and drains in-flight work on SIGTERM
+    before running the ``on_shutdown`` coroutines (e.g. closing pools).
+    """
+
+    def __init__(self, queue, handler=None, concurrency=10, metrics_port=None, drain_timeout=30,
+                 depth_check_interval=15, batch_handler=None, batch_size=1, batch_linger=0.02,
+                 on_shutdown=(), ordering_key=None, on_dead_letter=None):
+        if (handler is None) == (batch_handler is None):
+            raise ValueError("QueueConsumer needs exactly one of handler or batch_handler")
+        self.queue = queue
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.batch_size = min(batch_size, concurrency) if batch_handler else 1
+        self.batch_linger = batch_linger
+        self.on_shutdown = list(on_shutdown)
+        self.ordering_key = ordering_key
+        self.on_dead_letter = on_dead_letter
+        self.concurrency = concurrency
+        self.metrics_port = metrics_port
+        self.drain_timeout = drain_timeout
+        self.depth_check_interval = depth_check_interval
+        self.reader = AsyncQueueReader(queue, prefetch_count=concurrency)
+        self._in_flight = set()
+        # ordering key -> deliveries waiting behind the one in flight
+        self._keys = {}
+        self._stopping = False
+        self._connected = False
+        self._last_poll = None
+
+    @property
+    def queue_name(self):
+        return self.queue.queue_name
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    def stop(self):
+        if not self._stopping:
+            logger.info(f"Stopping consumer for '{self.queue_name}', draining {len(self._in_flight)} in-flight message(s)")
+        self._stopping = True
+
+    def health(self):
+        # Stale polls mean the I/O thread is stuck even if the process is alive
+        polling = self._last_poll is not None and time.monotonic() - self._last_poll < 30
+        healthy = self._connected and polling and not self._stopping
+        return healthy, {
+            "queue": self.queue_name,
+            "status": "draining" if self._stopping else ("ok" if healthy else "disconnected"),
+            "in_flight": len(self._in_flight),
+            "active_keys": len(self._keys),
+            "concurrency": self.concurrency,
+        }
+
+    async def serve(self):
+        self._install_signal_handlers()
+        if self.metrics_port:
+            start_metrics_server(self.metrics_port, health_check=self.health)
+
+        next_depth_check = 0
+        while not self._stopping:
+            try:
+                if time.monotonic() >= next_depth_check:
+                    await self.reader.depth()
+                    next_depth_check = time.monotonic() + self.depth_check_interval
+
+                deliveries = await self.reader.next_batch(self.batch_size, self.batch_linger)
+                self._connected = True
+                self._last_poll = time.monotonic()
+                if not deliveries:
+                    continue
+
+                self._dispatch(deliveries)
+            except Exception as e:
+                logger.error(f"Error consuming from '{self.queue_name}': {e}")
+                self._connected = False
+                # Unacked deliveries are redelivered once the broken connection is dropped
+                await self.reader.close()
+                await asyncio.sleep(1)
+
+        await self._drain()
+
+    async def _drain(self):
+        try:
+            await self.reader.stop_consuming()
+            deadline = time.monotonic() + self.drain_timeout
+            # Keep pumping the connection so acks from finishing tasks get sent
+            while self._in_flight and time.monotonic() < deadline:
+                await self.reader.process_events(0.2)
+            if self._in_flight:
+                logger.warning(f"{len(self._in_flight)} message(s) still in flight on '{self.queue_name}' after drain timeout; they will be redelivered")
+                for task in list(self._in_flight):
+                    task.cancel()
+        except Exception as e:
+            logger.error(f"Error draining consumer for '{self.queue_name}': {e}")
+        finally:
+            await self.reader.close()
+            for hook in self.on_shutdown:
+                try:
+                    await hook()
+                except Exception as e:
+                    logger.error(f"Shutdown hook failed for '{self.queue_name}': {e}")
+            logger.info(f"Consumer for '{self.queue_name}' stopped")
+
+    def _dispatch(self, deliveries):
+        if self.ordering_key is None:
+            self._track(self._handle(deliveries))
+            return
+        ready = []
+        for delivery in deliveries:
+            key = self._key_of(delivery)
+            waiting = self._keys.get(key)
+            if waiting is None:
+                self._keys[key] = deque()
+                ready.append((key, delivery))
+            else:
+                waiting.append(delivery)
+        if ready:
+            self._track(self._run_ordered(ready))
+
+    def _track(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    def _key_of(self, delivery):
+        key = None
+        try:
+            key = self.ordering_key(delivery.payload)
+        except Exception as e:
+            logger.warning(f"Could not compute ordering key on '{self.queue_name}': {e}")
+        # Keyless messages carry no ordering constraint
+        return key if key is not None else f"tag:{delivery.delivery_tag}"
+
+    async def _run_ordered(self, batch):
+        try:
+            while batch:
+                await self._handle([delivery for _, delivery in batch])
+                follow_up = []
+                for key, _ in batch:
+                    waiting = self._keys[key]
+                    if waiting:
+                        follow_up.append((key, waiting.popleft()))
+                    else:
+                        del self._keys[key]
+                batch = follow_up
+        finally:
+            # Only non-empty when cancelled on drain; leftovers are redelivered by the broker
+            for key, _ in batch:
+                self._keys.pop(key, None)
+
+    async def _handle(self, deliveries):
+        CONSUMER_IN_FLIGHT.labels(queue=self.queue_name).inc(len(deliveries))
+        try:
+            started = time.perf_counter()
+            payloads = [delivery.payload for delivery in deliveries]
+            reason = "handler reported failure"
+            try:
+                if self.batch_handler:
+                    results = list(await self.batch_handler(payloads))
+                    if len(results) != len(deliveries):
+                        raise ValueError(f"batch handler returned {len(results)} results for {len(deliveries)} payloads")
+                else:
+                    results = [await self.handler(payloads[0])]
+            except Exception as e:
+                logger.error(f"Handler error on '{self.queue_name}': {e}")
+                results, reason = [False] * len(deliveries), e
+            elapsed = time.perf_counter() - started
+            for _ in deliveries:
+                QUEUE_PROCESSING_SECONDS.labels(queue=self.queue_name).observe(elapsed)
+
+            for delivery, result in zip(deliveries, results):
+                await self._settle(delivery, result, reason)
+        finally:
+            CONSUMER_IN_FLIGHT.labels(queue=self.queue_name).dec(len(deliveries))
+
+    async def _settle(self, delivery, result, reason):
+        try:
+            if result is None:
+                await self.reader.ack(delivery)
+                outcome = "skipped"
+            elif result:
+                await self.reader.ack(delivery)
+                outcome = "success"
+            else:
+                retried = await self.reader.retry(delivery, reason=reason)
+                outcome = "retried" if retried else "dead_lettered"
+            QUEUE_MESSAGES_CONSUMED.labels(queue=self.queue_name, outcome=outcome).inc()
+            if outcome == "dead_lettered" and self.on_dead_letter:
+                await self.on_dead_letter(delivery.payload)
+        except Exception as e:
+            # Left unacked: the broker redelivers it when the channel goes away
+            logger.error(f"Error settling delivery {delivery.delivery_tag} on '{self.queue_name}': {e}")
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows: no loop signal handlers, fall back to the plain handler
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(self.stop))
@@ -0,0 +1,111 @@
+import time
+import logging
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of a claim
+CLAIMED = "claimed"
+DUPLICATE = "duplicate"
+IN_PROGRESS = "in_progress"
+
+_PROCESSING = "processing"
+_SENT = "sent"
+
+
+class DedupStore:
+    """Idempotency keys for outreach sends, so redeliveries never send twice.
+
+    A consumer claims an outreach before sending with an atomic
+    ``SET key processing NX EX processing_ttl``:
+
+    - ``CLAIMED``: nobody handled it yet, go ahead and send
+    - ``DUPLICATE``: already sent, ack without sending
+    - ``IN_PROGRESS``: another worker holds the claim, retry later
+
+    After the send the key is marked sent for ``sent_ttl`` seconds, or
+    released on failure so a retry can claim it again. A claim left by a
+    crashed worker expires after ``processing_ttl``. When Redis is
+    unreachable the store falls back to process-local keys.
+    """
+
+    def __init__(self, redis_url, namespace, processing_ttl=300, sent_ttl=7 * 24 * 3600):
+        self.namespace = namespace
+        self.processing_ttl = processing_ttl
+        self.sent_ttl = sent_ttl
+        self._redis = redis.from_url(redis_url, decode_responses=True)
+        self._local = {}
+
+    def key(self, outreach_id):
+        return f"outreach:{self.namespace}:{outreach_id}"
+
+    async def claim(self, outreach_id):
+        claims = await self.claim_many([outreach_id])
+        return claims[outreach_id]
+
+    async def claim_many(self, outreach_ids):
+        """Claim a batch in one round trip; returns ``{outreach_id: outcome}``."""
+        outreach_ids = list(dict.fromkeys(outreach_ids))
+        keys = [self.key(outreach_id) for outreach_id in outreach_ids]
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, _PROCESSING, nx=True, ex=self.processing_ttl)
+                    pipe.get(key)
+                replies = await pipe.execute()
+            claimed, values = replies[0::2], replies[1::2]
+        except Exception as e:
+            logger.warning(f"Dedup store unavailable, using local keys: {e}")
+            claimed, values = self._local_claim(keys)
+
+        claims = {}
+        for outreach_id, was_set, value in zip(outreach_ids, claimed, values):
+            if was_set:
+                claims[outreach_id] = CLAIMED
+            elif value == _SENT:
+                claims[outreach_id] = DUPLICATE
+            else:
+                claims[outreach_id] = IN_PROGRESS
+        return claims
+
+    async def settle(self, results):
+        """Mark ``{outreach_id: success}`` as sent or release the failed claims."""
+        if not results:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for outreach_id, success in results.items():
+                    if success:
+                        pipe.set(self.key(outreach_id), _SENT, ex=self.sent_ttl)
+                    else:
+                        pipe.delete(self.key(outreach_id))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Dedup store unavailable, using local keys: {e}")
+            for outreach_id, success in results.items():
+                if success:
+                    self._local[self.key(outreach_id)] = (_SENT, time.monotonic() + self.sent_ttl)
+                else:
+                    self._local.pop(self.key(outreach_id), None)
+
+    async def close(self):
+        await self._redis.aclose()
+
+    def _local_claim(self, keys):
+        now = time.monotonic()
+        claimed, values = [], []
+        for key in keys:
+            value, expires_at = self._local.get(key, (None, 0))
+            if expires_at <= now:
+                value = None
+            if value is None:
+                self._local[key] = (_PROCESSING, now + self.processing_ttl)
+                claimed.append(True)
+                values.append(_PROCESSING)
+            else:
+                claimed.append(False)
+                values.append(value)
+        if len(self._local) > 100_000:
+            self._local = {k: v for k, v in self._local.items() if v[1] > now}
+        return claimed, values
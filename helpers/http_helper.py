@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import importlib.util
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# httpx only speaks HTTP/2 when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PooledHTTPClient:
+    """Process-wide async HTTP client for outbound provider calls.
+
+    Wraps one ``httpx.AsyncClient`` so every request reuses keep-alive
+    connections (and HTTP/2 multiplexing when the server and ``h2`` allow it)
+    instead of paying a TCP+TLS handshake per message. ``max_concurrency``
+    bounds the requests in flight; further callers wait for a slot. The
+    client is created on first use so it binds to the running event loop.
+    """
+
+    def __init__(self, base_url="", headers=None, timeout=10, connect_timeout=5,
+                 max_connections=100, max_keepalive_connections=20, max_concurrency=50, http2=True):
+        self.base_url = base_url
+        self.headers = headers or {}
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def request(self, method, url, **kwargs):
+        async with self._slots:
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
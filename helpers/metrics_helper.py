@@ -0,0 +1,111 @@
+import os
+import json
+import threading
+import logging
+from http.server import ThreadingHTTPServer
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.exposition import MetricsHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+def metrics_registry():
+    """Registry to expose: this process's metrics, or those of every process
+    sharing ``PROMETHEUS_MULTIPROC_DIR`` (e.g. a consumer pool) when it is set."""
+    if not os.environ.get(MULTIPROC_DIR_ENV):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    return generate_latest(metrics_registry())
+
+
+# Queue and consumer metrics shared by the API (publish side) and the consumers.
+# multiprocess_mode only applies when PROMETHEUS_MULTIPROC_DIR is set.
+QUEUE_MESSAGES_PUBLISHED = Counter(
+    "queue_messages_published_total", "Messages published to a queue", ["queue"]
+)
+QUEUE_MESSAGES_CONSUMED = Counter(
+    "queue_messages_consumed_total", "Messages taken off a queue by outcome", ["queue", "outcome"]
+)
+QUEUE_MESSAGE_RETRIES = Counter(
+    "queue_message_retries_total", "Deliveries scheduled for a delayed retry", ["queue"]
+)
+QUEUE_MESSAGES_DEAD_LETTERED = Counter(
+    "queue_messages_dead_lettered_total", "Deliveries moved to the dead-letter queue", ["queue"]
+)
+QUEUE_DEPTH = Gauge(
+    "queue_depth", "Ready messages in a queue at the last check", ["queue"], multiprocess_mode="mostrecent"
+)
+QUEUE_TIME_IN_QUEUE = Histogram(
+    "queue_message_time_in_queue_seconds", "Time from first publish until a consumer fetched the message", ["queue"],
+    buckets=DEFAULT_BUCKETS,
+)
+QUEUE_PROCESSING_SECONDS = Histogram(
+    "queue_message_processing_seconds", "Time a consumer spent handling one message", ["queue"],
+    buckets=DEFAULT_BUCKETS,
+)
+CONSUMER_IN_FLIGHT = Gauge(
+    "consumer_messages_in_flight", "Deliveries currently being handled by a consumer", ["queue"],
+    multiprocess_mode="livesum",
+)
+
+
+class _MetricsHandler(MetricsHandler):
+    """prometheus_client's ``/metrics`` handler with a ``/health`` route next to it"""
+    health_check = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/health":
+            healthy, details = self.health_check()
+            body = json.dumps(details).encode("utf-8")
+            self.send_response(200 if healthy else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0", health_check=None):
+    """Serve ``/metrics`` (and ``/health`` when a check is given) from a daemon thread.
+
+    ``health_check`` is a callable returning ``(healthy, details_dict)``.
+    """
+    try:
+        if health_check is None:
+            server, _ = start_http_server(port, addr=host, registry=metrics_registry())
+        else:
+            handler = type("MetricsHandler", (_MetricsHandler,), {
+                "registry": metrics_registry(),
+                "health_check": staticmethod(health_check),
+            })
+            server = ThreadingHTTPServer((host, port), handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+    except OSError as e:
+        logger.error(f"Could not start metrics server on port {port}: {e}")
+        return None
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
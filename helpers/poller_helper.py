@@ -0,0 +1,56 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Poller:
+    """Background task that polls for work and can be woken early.
+
+    Subclasses implement ``run_once()``, which does one round of work and
+    returns True when more is already waiting (e.g. a full batch was
+    claimed); the next round then starts right away. Otherwise the loop
+    sleeps ``poll_interval`` seconds or until ``wake()`` is called, e.g.
+    from a NOTIFY listener. Errors are logged and the loop keeps going.
+    """
+
+    def __init__(self, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Run the next round right away instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def run(self):
+        logger.info(f"{type(self).__name__} started")
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{type(self).__name__} error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_once(self):
+        raise NotImplementedError
@@ -1,39 +1,172 @@
 import json
+import enum
+import time
+import asyncio
 import pika
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from helpers.metrics_helper import (
+    QUEUE_DEPTH,
+    QUEUE_MESSAGES_DEAD_LETTERED,
+    QUEUE_MESSAGES_PUBLISHED,
+    QUEUE_MESSAGE_RETRIES,
+    QUEUE_TIME_IN_QUEUE,
+)
 
 logger = logging.getLogger(__name__)
 
+RETRY_COUNT_HEADER = "x-retry-count"
+PUBLISHED_AT_KEY = "published_at"
+DEFAULT_MAX_PRIORITY = 10
+
+
+class MessagePriority(enum.IntEnum):
+    """Per-message priorities; higher values are delivered first under backlog."""
+    BULK = 1
+    DEFAULT = 5
+    TRANSACTIONAL = 9
+
+
+class PublishError(Exception):
+    """A batch publish stopped early; ``sent`` messages were confirmed by the broker."""
+
+    def __init__(self, message, sent):
+        super().__init__(message)
+        self.sent = sent
+
+
+class RetryPolicy:
+    """Exponential backoff schedule for a queue.
+
+    Each attempt gets its own delay queue (``<queue>.retry.<n>``) with a fixed
+    per-queue TTL that dead-letters back into the main queue, so a message
+    waiting out a long delay never blocks a shorter one behind it. Messages
+    that exhaust ``max_retries`` are parked in ``<queue>.dead``.
+    """
+
+    def __init__(self, max_retries=5, base_delay=5, multiplier=2, max_delay=900):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+
+    def delay_for(self, attempt):
+        """Delay in seconds before retry number ``attempt`` (1-based)."""
+        return min(self.base_delay * (self.multiplier ** (attempt - 1)), self.max_delay)
+
+
+class Delivery:
+    """A message fetched without auto-ack that must be acked or retried."""
+
+    def __init__(self, method, properties, body, channel=None):
+        self.method = method
+        self.properties = properties
+        self.body = body
+        self.channel = channel
+        self.payload = json.loads(body)
+
+    @property
+    def delivery_tag(self):
+        return self.method.delivery_tag
+
+    @property
+    def headers(self):
+        return (self.properties.headers or {}) if self.properties else {}
+
+    @property
+    def retry_count(self):
+        return int(self.headers.get(RETRY_COUNT_HEADER, 0))
+
+    @property
+    def priority(self):
+        return self.properties.priority if self.properties else None
+
+    @property
+    def time_in_queue(self):
+        """Seconds since the message was first published, if it was stamped."""
+        published_at = self.payload.get(PUBLISHED_AT_KEY) if isinstance(self.payload, dict) else None
+        if published_at is None:
+            return None
+        return max(time.time() - float(published_at), 0.0)
+
+
 class Queue:
-    def __init__(self, queue_name, connection_url):
+    def __init__(self, queue_name, connection_url, retry_policy=None, max_priority=DEFAULT_MAX_PRIORITY):
         self.queue_name = queue_name
         self.connection_url = connection_url
+        self.retry_policy = retry_policy
+        self.max_priority = max_priority
         self.connection = None
         self.channel = None
+        self._consumer = None
         self.setup_queue()
 
+    @property
+    def dead_letter_queue_name(self):
+        return f"{self.queue_name}.dead"
+
+    def retry_queue_name(self, attempt):
+        return f"{self.queue_name}.retry.{attempt}"
+
+    @property
+    def queue_arguments(self):
+        if not self.max_priority:
+            return None
+        return {"x-max-priority": self.max_priority}
+
+    def declare_queue(self, channel):
+        channel.queue_declare(queue=self.queue_name, arguments=self.queue_arguments)
+
     def setup_queue(self):
         try:
             self.connection = pika.BlockingConnection(pika.URLParameters(self.connection_url))
             self.channel = self.connection.channel()
-            self.channel.queue_declare(queue=self.queue_name)
+            self.declare_topology(self.channel)
             print(f"Queue '{self.queue_name}' is set up.")
         except pika.exceptions.AMQPConnectionError as e:
             print(f"Failed to connect to RabbitMQ: {e}")
         finally:
             if self.connection:
                 self.connection.close()
+            self.connection = None
+            self.channel = None
+
+    def declare_topology(self, channel):
+        self.declare_queue(channel)
+        if not self.retry_policy:
+            return
+        channel.queue_declare(queue=self.dead_letter_queue_name)
+        for attempt in range(1, self.retry_policy.max_retries + 1):
+            channel.queue_declare(
+                queue=self.retry_queue_name(attempt),
+                arguments={
+                    "x-message-ttl": int(self.retry_policy.delay_for(attempt) * 1000),
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue_name,
+                },
+            )
 
-    def put(self, message):
+    def put(self, message, priority=MessagePriority.DEFAULT):
         print(message)
+        connection = None
         try:
             connection = pika.BlockingConnection(pika.URLParameters(self.connection_url))
             print(connection)
             channel = connection.channel()
-            channel.queue_declare(queue=self.queue_name)
+            self.declare_queue(channel)
 
+            if isinstance(message, dict):
+                message = {**message, PUBLISHED_AT_KEY: time.time()}
             json_message = json.dumps(message)
-            channel.basic_publish(exchange='', routing_key=self.queue_name, body=json_message)
+            channel.basic_publish(
+                exchange='',
+                routing_key=self.queue_name,
+                body=json_message,
+                properties=pika.BasicProperties(priority=int(priority)),
+            )
+            QUEUE_MESSAGES_PUBLISHED.labels(queue=self.queue_name).inc()
 
             print(f"Sent message to queue '{self.queue_name}': {message}")
         except Exception as e:
@@ -42,11 +175,56 @@ class Queue:
             if connection:
                 connection.close()
 
+    def put_many(self, messages, priority=MessagePriority.DEFAULT):
+        """Publish a batch of messages over one connection; returns how many were sent.
+
+        The channel is in confirm mode and messages are published with
+        ``mandatory``, so each one counts only once the broker has taken
+        responsibility for it. On a failure ``PublishError`` is raised with
+        the number of messages confirmed before it, in order.
+        """
+        connection = None
+        sent = 0
+        try:
+            connection = pika.BlockingConnection(pika.URLParameters(self.connection_url))
+            channel = connection.channel()
+            self.declare_queue(channel)
+            channel.confirm_delivery()
+
+            published_at = time.time()
+            properties = pika.BasicProperties(priority=int(priority))
+            for message in messages:
+                if isinstance(message, dict):
+                    message = {**message, PUBLISHED_AT_KEY: published_at}
+                # Blocks until the broker acks; raises if it is nacked or unroutable
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=self.queue_name,
+                    body=json.dumps(message),
+                    properties=properties,
+                    mandatory=True,
+                )
+                sent += 1
+            print(f"Sent {sent} message(s) to queue '{self.queue_name}'")
+        except Exception as e:
+            raise PublishError(
+                f"Failed to publish to '{self.queue_name}' after {sent} of {len(messages)} message(s): {e!r}", sent
+            ) from e
+        finally:
+            QUEUE_MESSAGES_PUBLISHED.labels(queue=self.queue_name).inc(sent)
+            if connection:
+                try:
+                    connection.close()
+                except Exception as e:
+                    logger.warning(f"Error closing RabbitMQ connection: {e}")
+        return sent
+
     def get(self):
+        connection = None
         try:
             connection = pika.BlockingConnection(pika.URLParameters(self.connection_url))
             channel = connection.channel()
-            channel.queue_declare(queue=self.queue_name)
+            self.declare_queue(channel)
 
             _, _, body = channel.basic_get(queue=self.queue_name, auto_ack=True)
             data = None
@@ -59,9 +237,240 @@ class Queue:
             if connection:
                 connection.close()
 
+    # Long-lived consumer connection. Unlike put()/get(), deliveries fetched
+    # here stay unacked until the consumer has decided what to do with them.
+
+    def open(self):
+        if self.connection and self.connection.is_open:
+            return self.channel
+        self.connection = pika.BlockingConnection(pika.URLParameters(self.connection_url))
+        self.channel = self.connection.channel()
+        self.declare_topology(self.channel)
+        return self.channel
+
+    def close(self):
+        try:
+            if self.connection and self.connection.is_open:
+                self.connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing RabbitMQ connection: {e}")
+        finally:
+            self.connection = None
+            self.channel = None
+            self._consumer = None
+
+    def consume_next(self, prefetch_count, inactivity_timeout=1.0):
+        """Next pushed delivery, or None after ``inactivity_timeout`` idle seconds.
+
+        The broker never has more than ``prefetch_count`` unacked deliveries
+        outstanding on this channel, which is what bounds consumer concurrency.
+        """
+        if self._consumer is None:
+            channel = self.open()
+            channel.basic_qos(prefetch_count=prefetch_count)
+            self._consumer = channel.consume(self.queue_name, inactivity_timeout=inactivity_timeout)
+        method, properties, body = next(self._consumer)
+        if method is None:
+            return None
+        return self._to_delivery(self.channel, method, properties, body)
+
+    def consume_batch(self, prefetch_count, max_count, inactivity_timeout=1.0, linger=0.02):
+        """Up to ``max_count`` deliveries: blocks for the first one, then takes
+        whatever arrives within ``linger`` seconds. Returns [] when idle."""
+        first = self.consume_next(prefetch_count, inactivity_timeout)
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + linger
+        while len(batch) < max_count:
+            if self.channel.get_waiting_message_count() == 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # Returns early as soon as another delivery is dispatched
+                self.connection.process_data_events(time_limit=remaining)
+                if self.channel.get_waiting_message_count() == 0:
+                    break
+            delivery = self.consume_next(prefetch_count, inactivity_timeout)
+            if delivery is None:
+                break
+            batch.append(delivery)
+        return batch
+
+    def stop_consuming(self):
+        """Cancel the consumer; buffered, not yet handed out deliveries are requeued."""
+        if self._consumer is not None and self.channel and self.channel.is_open:
+            self.channel.cancel()
+        self._consumer = None
+
+    def process_events(self, time_limit=0.2):
+        """Service heartbeats and thread-safe callbacks (acks) without consuming."""
+        if self.connection and self.connection.is_open:
+            self.connection.process_data_events(time_limit=time_limit)
+
+    def _to_delivery(self, channel, method, properties, body):
+        try:
+            delivery = Delivery(method, properties, body, channel=channel)
+        except ValueError as e:
+            logger.error(f"Dropping undecodable message on '{self.queue_name}': {e}")
+            if self.retry_policy:
+                channel.basic_publish(exchange='', routing_key=self.dead_letter_queue_name, body=body)
+            channel.basic_ack(method.delivery_tag)
+            return None
+        if delivery.time_in_queue is not None:
+            QUEUE_TIME_IN_QUEUE.labels(queue=self.queue_name).observe(delivery.time_in_queue)
+        return delivery
+
+    def depth(self):
+        """Number of ready messages in the main queue; also exported as a gauge."""
+        channel = self.open()
+        result = channel.queue_declare(queue=self.queue_name, arguments=self.queue_arguments, passive=True)
+        message_count = result.method.message_count
+        QUEUE_DEPTH.labels(queue=self.queue_name).set(message_count)
+        return message_count
+
+    def ack(self, delivery):
+        (delivery.channel or self.channel).basic_ack(delivery.delivery_tag)
+
+    def retry(self, delivery, reason=None):
+        """Schedule a failed delivery for redelivery, or dead-letter it.
+
+        The message is republished to the delay queue for its next attempt
+        (or to the dead-letter queue once the policy is exhausted) before the
+        original is acked, so a crash in between redelivers rather than loses.
+        """
+        channel = delivery.channel or self.channel
+        if not self.retry_policy:
+            channel.basic_nack(delivery.delivery_tag, requeue=False)
+            return False
+
+        attempt = delivery.retry_count + 1
+        headers = dict(delivery.headers)
+        headers[RETRY_COUNT_HEADER] = attempt
+        if reason:
+            headers["x-last-error"] = str(reason)[:500]
+
+        if attempt > self.retry_policy.max_retries:
+            routing_key = self.dead_letter_queue_name
+            QUEUE_MESSAGES_DEAD_LETTERED.labels(queue=self.queue_name).inc()
+            logger.error(
+                f"Message on '{self.queue_name}' exhausted {self.retry_policy.max_retries} retries, "
+                f"dead-lettering: {delivery.payload}"
+            )
+        else:
+            routing_key = self.retry_queue_name(attempt)
+            QUEUE_MESSAGE_RETRIES.labels(queue=self.queue_name).inc()
+            logger.warning(
+                f"Retrying message on '{self.queue_name}' in {self.retry_policy.delay_for(attempt)}s "
+                f"(attempt {attempt}/{self.retry_policy.max_retries}): {reason}"
+            )
+
+        channel.basic_publish(
+            exchange='',
+            routing_key=routing_key,
+            body=delivery.body,
+            properties=pika.BasicProperties(headers=headers, priority=delivery.priority),
+        )
+        channel.basic_ack(delivery.delivery_tag)
+        return routing_key != self.dead_letter_queue_name
+
+    def replay_dead_letters(self, limit=None):
+        """Move dead-lettered messages back onto the main queue with a fresh retry budget."""
+        channel = self.open()
+        channel.queue_declare(queue=self.dead_letter_queue_name)
+        replayed = 0
+        while limit is None or replayed < limit:
+            method, properties, body = channel.basic_get(queue=self.dead_letter_queue_name, auto_ack=False)
+            if method is None:
+                break
+            headers = dict((properties.headers or {}) if properties else {})
+            headers.pop(RETRY_COUNT_HEADER, None)
+            channel.basic_publish(
+                exchange='',
+                routing_key=self.queue_name,
+                body=body,
+                properties=pika.BasicProperties(headers=headers, priority=properties.priority if properties else None),
+            )
+            channel.basic_ack(method.delivery_tag)
+            replayed += 1
+        return replayed
+
+
+class AsyncQueueReader:
+    """Drives a Queue's long-lived consumer connection from an asyncio loop.
+
+    pika's BlockingConnection is not thread-safe, so reads run on a single
+    dedicated I/O thread and acks/retries are handed to that thread with
+    ``add_callback_threadsafe``, which wakes it up even while it is blocked
+    waiting for the next delivery.
+    """
+
+    def __init__(self, queue, prefetch_count, inactivity_timeout=1.0):
+        self.queue = queue
+        self.prefetch_count = prefetch_count
+        self.inactivity_timeout = inactivity_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"amqp-{queue.queue_name}")
+
+    async def run(self, fn, *args):
+        """Run a blocking Queue call on the I/O thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    async def next_delivery(self):
+        return await self.run(self.queue.consume_next, self.prefetch_count, self.inactivity_timeout)
+
+    async def next_batch(self, max_count, linger=0.02):
+        return await self.run(self.queue.consume_batch, self.prefetch_count, max_count, self.inactivity_timeout, linger)
+
+    async def depth(self):
+        return await self.run(self.queue.depth)
+
+    async def ack(self, delivery):
+        return await self._call_threadsafe(self.queue.ack, delivery)
+
+    async def retry(self, delivery, reason=None):
+        return await self._call_threadsafe(self.queue.retry, delivery, reason)
+
+    async def stop_consuming(self):
+        await self.run(self.queue.stop_consuming)
+
+    async def process_events(self, time_limit=0.2):
+        await self.run(self.queue.process_events, time_limit)
+
+    async def close(self):
+        await self.run(self.queue.close)
+
+    def _call_threadsafe(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result=None, error=None):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def callback():
+            try:
+                result = fn(*args)
+            except Exception as e:
+                loop.call_soon_threadsafe(partial(resolve, error=e))
+            else:
+                loop.call_soon_threadsafe(partial(resolve, result=result))
+
+        connection = self.queue.connection
+        if connection is None or not connection.is_open:
+            # The delivery died with its connection; the broker will redeliver it.
+            future.set_exception(ConnectionError(f"RabbitMQ connection for '{self.queue.queue_name}' is closed"))
+            return future
+        connection.add_callback_threadsafe(callback)
+        return future
+
 
-def create_queue(queue_name, host, port, user, password, vhost):
+def create_queue(queue_name, host, port, user, password, vhost, retry_policy=None, max_priority=DEFAULT_MAX_PRIORITY):
     scheme = "amqp"
     connection_url = f"{scheme}://{user}:{password}@{host}:{port}{vhost}?heartbeat=60"
-    queue = Queue(queue_name, connection_url)
+    queue = Queue(queue_name, connection_url, retry_policy=retry_policy, max_priority=max_priority)
     return queue
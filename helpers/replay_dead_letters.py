@@ -0,0 +1,46 @@
+"""
+Replay dead-lettered messages back onto their main queue.
+
+Usage:
+    python -m helpers.replay_dead_letters email
+    python -m helpers.replay_dead_letters whatsapp --limit 100
+    python -m helpers.replay_dead_letters <raw_queue_name>
+"""
+
+import argparse
+
+from app.config import settings
+from helpers.queue_helper import create_queue
+
+QUEUE_ALIASES = {
+    "email": lambda: settings.EMAIL_QUEUE_NAME,
+    "whatsapp": lambda: settings.WHATSAPP_QUEUE_NAME,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay dead-lettered queue messages")
+    parser.add_argument("queue", help="'email', 'whatsapp' or a raw queue name")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of messages to replay")
+    args = parser.parse_args()
+
+    alias = QUEUE_ALIASES.get(args.queue)
+    queue_name = alias() if alias else args.queue
+
+    queue = create_queue(
+        queue_name=queue_name,
+        host=settings.RABBITMQ_HOST,
+        port=settings.RABBITMQ_PORT,
+        user=settings.RABBITMQ_USER,
+        password=settings.RABBITMQ_PASSWORD,
+        vhost=settings.RABBITMQ_VHOST
+    )
+    try:
+        replayed = queue.replay_dead_letters(limit=args.limit)
+    finally:
+        queue.close()
+    print(f"Replayed {replayed} message(s) from '{queue.dead_letter_queue_name}' to '{queue_name}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import text
+
+from app.models.outreach_log import OutreachStatus
+from helpers.buffered_writer_helper import BufferedWriter
+
+
+class OutreachStatusWriter(BufferedWriter):
+    """Buffers outreach status changes and writes them back in batches.
+
+    Consumers call ``record`` once per message; rows are flushed as a single
+    ``UPDATE outreach_logs ... FROM (VALUES ...)`` when ``max_rows`` are
+    buffered or ``flush_interval`` seconds have passed, instead of one write
+    transaction per message. The latest status recorded for an outreach wins.
+    """
+
+    def __init__(self, session_factory, max_rows=200, flush_interval=0.2):
+        super().__init__(max_rows=max_rows, flush_interval=flush_interval)
+        self.session_factory = session_factory
+
+    def record(self, outreach_id, status, sent_at=None):
+        if status == OutreachStatus.SENT and sent_at is None:
+            sent_at = datetime.now(UTC)
+        self._buffer(outreach_id, (OutreachStatus(status), sent_at))
+
+    def record_results(self, results):
+        """Record SENT for the successes of a ``{outreach_id: success}`` mapping.
+
+        Failures are left as they are: the delivery is retried, and only
+        ``record_dead_letter`` marks an outreach FAILED.
+        """
+        for outreach_id, success in results.items():
+            if success:
+                self.record(outreach_id, OutreachStatus.SENT)
+
+    async def record_dead_letter(self, payload):
+        """``QueueConsumer`` dead-letter hook: the outreach will not be retried again."""
+        outreach_id = payload.get("outreach_id") if isinstance(payload, dict) else None
+        if outreach_id is not None:
+            self.record(outreach_id, OutreachStatus.FAILED)
+
+    async def _write(self, rows):
+        values = []
+        params = {}
+        for i, (outreach_id, (status, sent_at)) in enumerate(rows.items()):
+            values.append(
+                f"(CAST(:id_{i} AS integer), CAST(:status_{i} AS outreachstatus), CAST(:sent_at_{i} AS timestamptz))"
+            )
+            params[f"id_{i}"] = outreach_id
+            # The enum column stores member names
+            params[f"status_{i}"] = status.name
+            params[f"sent_at_{i}"] = sent_at
+
+        query = text(f"""
+            update outreach_logs as o
+            set status = v.status,
+                -- A failed outreach was never sent (older rows carry the insert time here)
+                sent_at = case when v.status = 'FAILED' then null else coalesce(v.sent_at, o.sent_at) end
+            from (values {", ".join(values)}) as v(id, status, sent_at)
+            where o.id = v.id
+        """)
+        async with self.session_factory() as db:
+            await db.execute(query, params)
+            await db.commit()
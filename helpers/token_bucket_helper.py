@@ -0,0 +1,93 @@
+import time
+import random
+import asyncio
+import logging
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket from the Redis clock and takes tokens atomically.
+# Returns 0 when the tokens were taken, otherwise the milliseconds to wait.
+_TAKE_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+
+class _LocalBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, requested):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= requested:
+            self.tokens -= requested
+            return 0
+        return (requested - self.tokens) / self.rate
+
+
+class TokenBucket:
+    """Rate limit shared by every worker process sending as the same sender.
+
+    ``name`` identifies the provider and sender (e.g. ``whatsapp:<number>``);
+    all processes using the same name draw from one Redis bucket refilled at
+    ``rate`` tokens per second, holding at most ``capacity`` tokens for bursts.
+    ``acquire`` waits until a token is available instead of failing. If Redis
+    is unreachable each process falls back to its own local bucket.
+    """
+
+    def __init__(self, redis_url, name, rate, capacity=None):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._redis = redis.from_url(redis_url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._local = _LocalBucket(rate, self.capacity)
+
+    @property
+    def key(self):
+        return f"ratelimit:{self.name}"
+
+    async def acquire(self, tokens=1):
+        """Wait until ``tokens`` are available and take them; returns seconds waited."""
+        started = time.monotonic()
+        while True:
+            wait = await self._try_take(tokens)
+            if wait <= 0:
+                return time.monotonic() - started
+            # Jitter so waiting workers don't all hit Redis on the same tick
+            await asyncio.sleep(wait + random.uniform(0, wait / 10))
+
+    async def close(self):
+        await self._redis.aclose()
+
+    async def _try_take(self, tokens):
+        try:
+            wait_ms = await self._take(keys=[self.key], args=[self.rate, self.capacity, tokens])
+            return int(wait_ms) / 1000
+        except Exception as e:
+            logger.warning(f"Rate limiter '{self.name}' using local bucket, Redis unavailable: {e}")
+            return self._local.take(tokens)
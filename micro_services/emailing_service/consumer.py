@@ -1,61 +1,130 @@
 from app.config import settings
-from helpers.queue_helper import create_queue
-from micro_services.emailing_service.email_helper import send_outreach_message_to_creator
-from app.database import get_db_session
-import time
+from helpers.queue_helper import create_queue, RetryPolicy
+from helpers.consumer_helper import QueueConsumer, recipient_key
+from micro_services.emailing_service.email_helper import send_outreach_messages_to_creators, send_notification_email
+from app.database import AsyncSessionLocal
+from app.services.email_service import email_service, NOTIFICATION_KIND
+from helpers.status_writer_helper import OutreachStatusWriter
+from helpers.dedup_helper import DedupStore, CLAIMED, DUPLICATE
 import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def fetch_and_process_outreach(outreach_id):
-    db_session = None
+status_writer = OutreachStatusWriter(
+    AsyncSessionLocal,
+    max_rows=settings.OUTREACH_STATUS_FLUSH_ROWS,
+    flush_interval=settings.OUTREACH_STATUS_FLUSH_INTERVAL_MS / 1000,
+)
+
+dedup_store = DedupStore(
+    settings.REDIS_URL,
+    namespace="email",
+    processing_ttl=settings.OUTREACH_DEDUP_PROCESSING_TTL,
+    sent_ttl=settings.OUTREACH_DEDUP_SENT_TTL,
+)
+
+async def fetch_and_process_outreaches(outreach_ids):
     try:
-        # Get database session using the helper function
-        db_session = await get_db_session()
-        
-        # Pass the database session to the function
-        result = await send_outreach_message_to_creator(outreach_id, db_session)
-        if result:
-            print(f"Successfully processed outreach ID: {outreach_id}")
-        else:
-            print(f"Failed to process outreach ID: {outreach_id}")
+        # Sessions come from the shared engine pool of this long-lived loop
+        async with AsyncSessionLocal() as db_session:
+            results = await send_outreach_messages_to_creators(outreach_ids, db_session)
+        for outreach_id, result in results.items():
+            if result:
+                print(f"Successfully processed outreach ID: {outreach_id}")
+            else:
+                print(f"Failed to process outreach ID: {outreach_id}")
+        return results
     except Exception as e:
-        logger.error(f"Error processing outreach ID {outreach_id}: {e}")
-        print(f"Error processing outreach ID {outreach_id}: {e}")
-    finally:
-        if db_session:
-            try:
-                await db_session.close()
-            except Exception as e:
-                logger.error(f"Error closing database session: {e}")
+        logger.error(f"Error processing outreach IDs {outreach_ids}: {e}")
+        print(f"Error processing outreach IDs {outreach_ids}: {e}")
+        return {outreach_id: False for outreach_id in outreach_ids}
 
-def consume():
+def outreach_id_to_send(payload):
+    print(f"Email payload: {payload}")
+    outreach_id = payload.get("outreach_id")
+    status = payload.get("status")
+    if outreach_id is None or status != "initiated":
+        return None
+    print(f"Sending email outreach for {outreach_id} with status {status}")
+    return outreach_id
+
+def notification_key(payload):
+    """Dedup key of a queued notification, or None for outreach payloads"""
+    if payload.get("kind") != NOTIFICATION_KIND:
+        return None
+    return f"notification:{payload.get('notification_id')}"
+
+async def send_notifications(payloads_by_key):
+    results = await asyncio.gather(*(send_notification_email(payload) for payload in payloads_by_key.values()))
+    return dict(zip(payloads_by_key, results))
+
+async def handle_payloads(payloads):
+    # Each payload is either a notification (sent as is) or an outreach id to look up
+    keys = []
+    for payload in payloads:
+        key = notification_key(payload)
+        keys.append(key if key is not None else outreach_id_to_send(payload))
+    to_claim = [key for key in keys if key is not None]
+    claims = await dedup_store.claim_many(to_claim) if to_claim else {}
+
+    claimed_outreaches = []
+    claimed_notifications = {}
+    for key, payload in zip(keys, payloads):
+        if key is None or claims[key] != CLAIMED:
+            continue
+        if payload.get("kind") == NOTIFICATION_KIND:
+            claimed_notifications[key] = payload
+        else:
+            claimed_outreaches.append(key)
+    outreach_results = await fetch_and_process_outreaches(claimed_outreaches) if claimed_outreaches else {}
+    notification_results = await send_notifications(claimed_notifications) if claimed_notifications else {}
+    results = {**outreach_results, **notification_results}
+    await dedup_store.settle(results)
+    status_writer.record_results(outreach_results)
+
+    handled = []
+    for key in keys:
+        if key is None:
+            handled.append(None)
+        elif claims[key] == DUPLICATE:
+            print(f"{key} was already sent, skipping redelivery")
+            handled.append(None)
+        else:
+            # Claimed by another worker: retry later in case that worker fails
+            handled.append(results.get(key, False))
+    return handled
+
+def build_consumer():
     queue = create_queue(
         queue_name=settings.EMAIL_QUEUE_NAME,
         host=settings.RABBITMQ_HOST,
         port=settings.RABBITMQ_PORT,
         user=settings.RABBITMQ_USER,
         password=settings.RABBITMQ_PASSWORD,
-        vhost=settings.RABBITMQ_VHOST
+        vhost=settings.RABBITMQ_VHOST,
+        retry_policy=RetryPolicy(
+            max_retries=settings.EMAIL_QUEUE_MAX_RETRIES,
+            base_delay=settings.EMAIL_QUEUE_RETRY_BASE_DELAY,
+            max_delay=settings.QUEUE_RETRY_MAX_DELAY,
+        )
     )
-    while True:
-        try:
-            payload = queue.get()
-            if payload:
-                print(f"Email payload: {payload}")
-                outreach_id = payload["outreach_id"]
-                status = payload["status"]
-                if status == "initiated":
-                    print(f"Sending email outreach for {outreach_id} with status {status}")
-                    asyncio.run(fetch_and_process_outreach(outreach_id))
-            else:
-                pass
-                # print("No messages in the queue, waiting...")
-        except Exception as e:
-            print(f"Error consuming message: {e}")
-        finally:
-            time.sleep(1)
+    return QueueConsumer(
+        queue,
+        batch_handler=handle_payloads,
+        batch_size=settings.EMAIL_CONSUMER_BATCH_SIZE,
+        batch_linger=settings.CONSUMER_BATCH_LINGER_MS / 1000,
+        concurrency=settings.EMAIL_CONSUMER_CONCURRENCY,
+        metrics_port=settings.EMAIL_CONSUMER_METRICS_PORT + settings.CONSUMER_WORKER_INDEX,
+        drain_timeout=settings.CONSUMER_DRAIN_TIMEOUT,
+        depth_check_interval=settings.QUEUE_DEPTH_CHECK_INTERVAL,
+        on_shutdown=[status_writer.close, dedup_store.close, email_service.close],
+        ordering_key=recipient_key,
+        on_dead_letter=status_writer.record_dead_letter,
+    )
+
+def consume():
+    build_consumer().run()
 
 if __name__ == "__main__":
-    consume()
\ No newline at end of file
+    consume()
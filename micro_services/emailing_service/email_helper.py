@@ -1,35 +1,116 @@
-from app.services.email_service import EmailService
-from app.models.outreach_log import OutreachLog, OutreachType
+from app.services.email_service import email_service
+from app.services.template_registry import template_registry, parse_template_reference
 
 from sqlalchemy import  text
+import asyncio
 
 
-async def send_outreach_message_to_creator(outreach_id, db):
-    query = text(f"""
-        select * from outreach_logs where id = {outreach_id} and outreach_type = 'EMAIL'
+async def fetch_email_outreaches(outreach_ids, db):
+    """Load the email outreach rows, with what their templates need, in one round trip."""
+    query = text("""
+        select o.id, o.outreach_type, o.recipient_contact, o.subject, o.message,
+               cc.offered_rate, cr.full_name as creator_name,
+               c.title as campaign_title, c.brand_name,
+               coalesce(c.description, 'Please check your dashboard for full details.') as campaign_description
+        from outreach_logs o
+        join campaign_creators cc on cc.id = o.campaign_creator_id
+        join creators cr on cr.id = cc.creator_id
+        join campaigns c on c.id = cc.campaign_id
+        where o.id = ANY(:ids) and o.outreach_type = 'EMAIL'
     """)
+    result = await db.execute(query, {"ids": list(outreach_ids)})
+    return {row["id"]: dict(row) for row in result.mappings().all()}
+
+
+def render_outreach_bodies(outreaches):
+    """Render bodies stored as template references; one compiled template per batch.
+
+    Rows created before bodies moved to the consumer hold the rendered text
+    already and are sent as is.
+    """
+    by_template = {}
+    for outreach in outreaches.values():
+        reference = parse_template_reference(outreach["message"])
+        if reference is None:
+            outreach["body"] = outreach["message"]
+        else:
+            by_template.setdefault(reference, []).append(outreach)
+
+    for (name, version), group in by_template.items():
+        try:
+            bodies = template_registry.render_many(name, group, version=version)
+        except Exception as e:
+            print(f"Error rendering template {name} v{version}: {e}")
+            bodies = [None] * len(group)
+        for outreach, body in zip(group, bodies):
+            outreach["body"] = body
+
+
+async def send_outreach_email(outreach_id, outreach):
+    if not outreach:
+        print(f"No outreach found for ID: {outreach_id}")
+        return False
+
+    if outreach["outreach_type"] != 'EMAIL':
+        print("Outreach type is not email, skipping.")
+        return False
+
+    if outreach.get("body") is None:
+        print(f"No body could be rendered for outreach {outreach_id}")
+        return False
+
     try:
-        result = await db.execute(query)
-        outreach = result.mappings().fetchone()
-        
-        outreach = OutreachLog(**outreach) if outreach else None
-        if not outreach:
-            print(f"No outreach found for ID: {outreach_id}")
-            return False
-        
-        if outreach.outreach_type != 'EMAIL':
-            print("Outreach type is not email, skipping.")
-            return False
-
-        email = outreach.recipient_contact
-        await EmailService().send_email(
-            to_email=email,
-            subject=outreach.subject,
-            body=outreach.message,
+        sent = await email_service.send_email(
+            to_email=outreach["recipient_contact"],
+            subject=outreach["subject"],
+            body=outreach["body"],
             is_html=False,
         )
+    except Exception as e:
+        print(f"Error sending outreach email {outreach_id}: {e}")
+        return False
+    if sent:
         print("Mail sent successfully.")
-        return True
+    return sent
+
+
+async def send_notification_email(payload):
+    """Render and send a queued notification (contract, payment); returns success"""
+    try:
+        body = template_registry.render(
+            payload["template"], payload.get("template_version"), **payload.get("context", {})
+        )
+        return await email_service.send_email(
+            to_email=payload["recipient_contact"],
+            subject=payload["subject"],
+            body=body,
+            is_html=False,
+        )
+    except Exception as e:
+        print(f"Error sending notification {payload.get('notification_id')}: {e}")
+        return False
+
+
+async def send_outreach_messages_to_creators(outreach_ids, db):
+    """Send a batch of email outreaches; returns {outreach_id: success}."""
+    outreach_ids = list(dict.fromkeys(outreach_ids))
+    try:
+        outreaches = await fetch_email_outreaches(outreach_ids, db)
+        # End the read-only transaction so the connection returns to the pool during the sends
+        await db.rollback()
     except Exception as e:
         print(f"Error fetching outreach data: {e}")
-        return False
\ No newline at end of file
+        return {outreach_id: False for outreach_id in outreach_ids}
+
+    # Rendering happens here, at send time, rather than in the API
+    render_outreach_bodies(outreaches)
+
+    results = await asyncio.gather(
+        *(send_outreach_email(outreach_id, outreaches.get(outreach_id)) for outreach_id in outreach_ids)
+    )
+    return dict(zip(outreach_ids, results))
+
+
+async def send_outreach_message_to_creator(outreach_id, db):
+    results = await send_outreach_messages_to_creators([outreach_id], db)
+    return results[outreach_id]
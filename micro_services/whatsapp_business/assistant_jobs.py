@@ -0,0 +1,176 @@
+import json
+import asyncio
+import hashlib
+import logging
+
+from app.services.conversation_routes import CONVERSATION_ROUTES_CHANNEL
+from helpers.poller_helper import Poller
+from micro_services.whatsapp_business.assistants_client import assistants_client
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_MODEL = "gpt-3.5-turbo"
+
+ASSISTANT_TOOLS = [
+  {
+    "type": "function",
+    "function": {
+      "name": "update_outreach_status",
+      "description": "Update the status of outreach lifecycle in the database",
+      "parameters": {
+        "type": "object",
+        "properties": {
+          "creator_id": {"type": "string"},
+          "campaign_id": {"type": "string"},
+          "status": {
+            "type": "string",
+            "enum": ["faq_answered", "negotiation_started", "price_agreed", "deal_closed"]
+          },
+          "final_price": {"type": "number"},
+          "deliverables": {"type": "string"},
+          "timeline": {"type": "string"}
+        },
+        "required": ["creator_id", "campaign_id", "status"]
+      }
+    }
+  }
+]
+
+CAMPAIGN_QUERY = """
+    select id, title, description, brand_name, campaign_type, start_date, end_date, budget,
+           target_audience->>'value' as target_audience, deliverables->>'value' as deliverables
+    from campaigns where id = $1
+"""
+
+# Pending jobs, plus running ones whose worker died; legacy campaigns keep their assistant
+CLAIM_JOBS_QUERY = """
+    update campaign_assistants as ca set status = 'running', updated_at = now()
+    from campaigns c
+    where c.id = ca.campaign_id and ca.campaign_id in (
+        select campaign_id from campaign_assistants
+        where status = 'pending'
+           or (status = 'running' and updated_at < now() - make_interval(secs => $2))
+        order by requested_at
+        limit $1
+        for update skip locked
+    )
+    returning ca.campaign_id, ca.requested_at, ca.config_hash, coalesce(ca.assistant_id, c.assistant_id) as assistant_id
+"""
+
+SHARED_ASSISTANT_QUERY = """
+    select assistant_id from campaign_assistants
+    where config_hash = $1 and status = 'ready' and assistant_id is not null
+    limit 1
+"""
+
+ASSISTANT_IN_USE_QUERY = """
+    select exists(select 1 from campaign_assistants where assistant_id = $1 and campaign_id <> $2)
+"""
+
+# A request that arrived while the job ran leaves the row pending for another round
+FINISH_JOB_QUERY = """
+    update campaign_assistants set
+        assistant_id = $2, config_hash = $3, error = null, updated_at = now(),
+        status = case when requested_at = $4 then 'ready' else status end
+    where campaign_id = $1
+"""
+
+FAIL_JOB_QUERY = """
+    update campaign_assistants set
+        error = $2, updated_at = now(),
+        status = case when requested_at = $3 then 'failed' else status end
+    where campaign_id = $1
+"""
+
+
+def render_assistant_config(campaign):
+    """Assistant payload (name, instructions, tools, model) for a campaign row"""
+    description = (
+        f"{campaign['description']} brand_name: {campaign['brand_name']} campaign_type: {campaign['campaign_type']} "
+        f"start_date: {campaign['start_date']} end_date: {campaign['end_date']} "
+        f"target_audience: {campaign['target_audience']} deliverables: {campaign['deliverables']} "
+        "You are an good outreach agent with good negotiation skills. You are able to negotiate with creators and "
+        "close deals with them. You are able to answer questions related to the campaign and negotiate prices "
+        "within the budget."
+    )
+    system_prompt = f"""
+    You are an outreach agent for the campaign "{campaign['title']}".
+    Campaign Description: {description}
+    Budget: {campaign['budget']}
+    Answer questions, negotiate prices within the budget, and close deals with creators.
+    """
+    return {
+        "name": f"Assistant for {campaign['title']}",
+        "instructions": system_prompt,
+        "tools": ASSISTANT_TOOLS,
+        "model": ASSISTANT_MODEL,
+    }
+
+
+def assistant_config_hash(config):
+    """Identity of an assistant's behaviour: instructions, tools and model"""
+    key = {field: config[field] for field in ("instructions", "tools", "model")}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+class AssistantJobWorker(Poller):
+    """Provisions campaign assistants off the request path.
+
+    Jobs are ``campaign_assistants`` rows marked pending by the API; the
+    worker claims them with ``FOR UPDATE SKIP LOCKED`` when woken by a NOTIFY
+    (or every ``poll_interval`` seconds) and, per campaign, reuses an
+    assistant with the same config hash, updates the campaign's own
+    assistant in place, or creates one, in that order of preference. Running
+    jobs older than ``stale_after`` seconds are picked up again.
+    """
+
+    def __init__(self, get_pool, batch_size=10, poll_interval=30, stale_after=600):
+        super().__init__(poll_interval=poll_interval)
+        self.get_pool = get_pool
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+
+    async def run_once(self):
+        jobs = await self.get_pool().fetch(CLAIM_JOBS_QUERY, self.batch_size, self.stale_after)
+        await asyncio.gather(*(self.provision(job) for job in jobs))
+        return len(jobs) >= self.batch_size
+
+    async def provision(self, job):
+        pool = self.get_pool()
+        campaign_id = job["campaign_id"]
+        try:
+            campaign = await pool.fetchrow(CAMPAIGN_QUERY, campaign_id)
+            if campaign is None:
+                raise ValueError(f"Campaign {campaign_id} not found")
+            config = render_assistant_config(campaign)
+            config_hash = assistant_config_hash(config)
+            config["metadata"] = {"config_hash": config_hash}
+
+            assistant_id = job["assistant_id"]
+            if assistant_id and job["config_hash"] == config_hash:
+                logger.info(f"Assistant for campaign {campaign_id} is up to date")
+            elif shared_id := await pool.fetchval(SHARED_ASSISTANT_QUERY, config_hash):
+                assistant_id = shared_id
+            elif assistant_id and not await pool.fetchval(ASSISTANT_IN_USE_QUERY, assistant_id, campaign_id):
+                await assistants_client.update_assistant(assistant_id, config)
+            else:
+                assistant_id = (await assistants_client.create_assistant(config))["id"]
+        except Exception as e:
+            logger.error(f"Provisioning assistant for campaign {campaign_id} failed: {e}")
+            await pool.execute(FAIL_JOB_QUERY, campaign_id, str(e), job["requested_at"])
+            return
+
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(FINISH_JOB_QUERY, campaign_id, assistant_id, config_hash, job["requested_at"])
+                changed = await connection.execute(
+                    "UPDATE campaigns SET assistant_id=$1 WHERE id=$2 AND assistant_id IS DISTINCT FROM $1",
+                    assistant_id, campaign_id
+                )
+                if changed != "UPDATE 0":
+                    await connection.execute(
+                        "UPDATE conversation_routes SET assistant_id=$1, updated_at=now() WHERE campaign_id=$2",
+                        assistant_id, campaign_id
+                    )
+                    await connection.execute("SELECT pg_notify($1, '*')", CONVERSATION_ROUTES_CHANNEL)
+        logger.info(f"Campaign {campaign_id} uses assistant {assistant_id}")
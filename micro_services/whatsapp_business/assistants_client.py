@@ -0,0 +1,119 @@
+import time
+import asyncio
+import logging
+
+from app.config import settings
+from helpers.http_helper import PooledHTTPClient
+
+logger = logging.getLogger(__name__)
+
+# Run states after which polling stops; requires_action waits on the caller
+TERMINAL_RUN_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete"}
+ACTION_RUN_STATUSES = {"requires_action"}
+
+
+class RunTimeoutError(Exception):
+    pass
+
+
+class AssistantsClient:
+    """Async client for the OpenAI Assistants v2 REST API.
+
+    Every call goes through one pooled keep-alive HTTP client with per-call
+    timeouts, so a single worker can carry many conversations at once. Run
+    status is polled with exponential backoff instead of a fixed sleep.
+    """
+
+    def __init__(self, api_key, timeout=30, max_concurrency=100, run_timeout=120,
+                 poll_initial=0.25, poll_max=2.0, poll_multiplier=1.5):
+        self.http = PooledHTTPClient(
+            base_url="https://api.openai.com/v1",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "OpenAI-Beta": "assistants=v2",
+            },
+            timeout=timeout,
+            max_concurrency=max_concurrency,
+        )
+        self.run_timeout = run_timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_multiplier = poll_multiplier
+
+    async def _request(self, method, path, **kwargs):
+        response = await self.http.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def create_thread(self):
+        return await self._request("POST", "/threads")
+
+    async def add_message(self, thread_id, content, role="user"):
+        return await self._request("POST", f"/threads/{thread_id}/messages", json={
+            "role": role,
+            "content": content
+        })
+
+    async def create_run(self, thread_id, assistant_id):
+        return await self._request("POST", f"/threads/{thread_id}/runs", json={
+            "assistant_id": assistant_id
+        })
+
+    async def get_run(self, thread_id, run_id):
+        return await self._request("GET", f"/threads/{thread_id}/runs/{run_id}")
+
+    async def wait_for_run(self, thread_id, run_id, timeout=None):
+        """Poll until the run finishes or needs action; returns the last run object"""
+        deadline = time.monotonic() + (timeout or self.run_timeout)
+        delay = self.poll_initial
+        while True:
+            run = await self.get_run(thread_id, run_id)
+            if run["status"] in TERMINAL_RUN_STATUSES or run["status"] in ACTION_RUN_STATUSES:
+                return run
+            if time.monotonic() + delay > deadline:
+                raise RunTimeoutError(f"Run {run_id} on thread {thread_id} still {run['status']} after timeout")
+            await asyncio.sleep(delay)
+            delay = min(delay * self.poll_multiplier, self.poll_max)
+
+    async def submit_tool_outputs(self, thread_id, run_id, tool_outputs):
+        """``tool_outputs`` is a list of ``{"tool_call_id", "output"}``; returns the resumed run"""
+        return await self._request("POST", f"/threads/{thread_id}/runs/{run_id}/submit_tool_outputs", json={
+            "tool_outputs": tool_outputs
+        })
+
+    async def cancel_run(self, thread_id, run_id):
+        return await self._request("POST", f"/threads/{thread_id}/runs/{run_id}/cancel")
+
+    async def list_messages(self, thread_id, limit=20, order="desc", after=None, run_id=None):
+        params = {"limit": limit, "order": order}
+        if after:
+            params["after"] = after
+        if run_id:
+            params["run_id"] = run_id
+        return await self._request("GET", f"/threads/{thread_id}/messages", params=params)
+
+    async def latest_reply(self, thread_id, run_id=None):
+        """Text of the newest assistant message (of ``run_id`` if given), or None"""
+        messages = await self.list_messages(thread_id, limit=10, run_id=run_id)
+        for message in messages["data"]:
+            if message["role"] == "assistant" and message["content"]:
+                return message["content"][0]["text"]["value"]
+        return None
+
+    async def create_assistant(self, payload):
+        return await self._request("POST", "/assistants", json=payload)
+
+    async def update_assistant(self, assistant_id, payload):
+        return await self._request("POST", f"/assistants/{assistant_id}", json=payload)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+assistants_client = AssistantsClient(
+    settings.OPENAI_API_KEY,
+    timeout=settings.OPENAI_HTTP_TIMEOUT,
+    max_concurrency=settings.OPENAI_MAX_CONCURRENCY,
+    run_timeout=settings.OPENAI_RUN_TIMEOUT,
+)
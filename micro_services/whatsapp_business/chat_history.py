@@ -0,0 +1,87 @@
+import asyncio
+import logging
+
+from micro_services.whatsapp_business.assistants_client import assistants_client
+
+logger = logging.getLogger(__name__)
+
+LAST_MESSAGE_QUERY = """
+    select message_id from chat_messages where thread_id = $1 order by seq desc limit 1
+"""
+
+INSERT_MESSAGE_QUERY = """
+    insert into chat_messages (message_id, thread_id, role, content, created_at, synced_at)
+    values ($1, $2, $3, $4, $5, now())
+    on conflict (message_id) do nothing
+"""
+
+
+def message_text(message):
+    return " ".join(
+        block.get("text", {}).get("value", "")
+        for block in message.get("content", [])
+        if block.get("type") == "text"
+    )
+
+
+class ChatHistoryStore:
+    """Keeps ``chat_messages`` in step with the OpenAI threads.
+
+    ``sync`` pages through the thread in ascending order starting ``after``
+    the last stored message, so each call only transfers what is new. It
+    stops before a message that is still ``in_progress``, which is picked up
+    by the next sync; ``incomplete`` messages of cancelled runs are stored
+    as they are. Syncs of one thread never overlap.
+    """
+
+    def __init__(self, get_pool, page_size=100):
+        self.get_pool = get_pool
+        self.page_size = page_size
+        self._locks = {}  # thread_id -> [lock, syncs holding or waiting for it]
+
+    async def sync(self, thread_id):
+        # One lock per thread with a sync running or waiting; dropped by the last one out
+        entry = self._locks.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._sync(thread_id)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[thread_id]
+
+    def schedule_sync(self, thread_id):
+        """Fire-and-forget sync, e.g. for a NOTIFY from the API"""
+        task = asyncio.create_task(self.sync(thread_id))
+
+        def log_failure(task):
+            if not task.cancelled() and task.exception():
+                logger.error(f"Chat history sync of {thread_id} failed: {task.exception()}")
+
+        task.add_done_callback(log_failure)
+        return task
+
+    async def _sync(self, thread_id):
+        pool = self.get_pool()
+        after = await pool.fetchval(LAST_MESSAGE_QUERY, thread_id)
+        synced = 0
+        while True:
+            page = await assistants_client.list_messages(thread_id, limit=self.page_size, order="asc", after=after)
+            rows = []
+            for message in page["data"]:
+                # incomplete (e.g. a cancelled run) is final too; only wait on messages still being written
+                if message.get("status") == "in_progress":
+                    break
+                rows.append((
+                    message["id"], thread_id, message["role"], message_text(message), message["created_at"]
+                ))
+            if rows:
+                await pool.executemany(INSERT_MESSAGE_QUERY, rows)
+                synced += len(rows)
+                after = rows[-1][0]
+            if len(rows) < len(page["data"]) or not page.get("has_more"):
+                break
+        if synced:
+            logger.info(f"Synced {synced} message(s) of thread {thread_id}")
+        return synced
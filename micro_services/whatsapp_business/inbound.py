@@ -0,0 +1,143 @@
+import asyncio
+import logging
+
+from helpers.poller_helper import Poller
+
+logger = logging.getLogger(__name__)
+
+INSERT_MESSAGE_QUERY = """
+    insert into whatsapp_inbound_messages (message_id, mobile, body, attempts, received_at)
+    values ($1, $2, $3, 0, now())
+    on conflict (message_id) do nothing
+    returning id
+"""
+
+# New rows, and rows whose claim went stale (the process handling them died)
+CLAIM_MESSAGES_QUERY = """
+    update whatsapp_inbound_messages set claimed_at = now(), attempts = attempts + 1
+    where id in (
+        select id from whatsapp_inbound_messages
+        where processed_at is null
+          and attempts < $3
+          and (claimed_at is null or claimed_at < now() - make_interval(secs => $2))
+        order by id
+        limit $1
+        for update skip locked
+    )
+    returning id, message_id, mobile, body, attempts
+"""
+
+COMPLETE_MESSAGES_QUERY = """
+    update whatsapp_inbound_messages set processed_at = now() where id = any($1::int[])
+"""
+
+# A failed turn gives its rows back to the next claim instead of waiting out stale_after
+RELEASE_MESSAGES_QUERY = """
+    update whatsapp_inbound_messages set claimed_at = null
+    where id = any($1::int[]) and processed_at is null
+"""
+
+PURGE_MESSAGES_QUERY = """
+    delete from whatsapp_inbound_messages
+    where received_at < now() - make_interval(hours => $1)
+      and (processed_at is not null or attempts >= $2)
+"""
+
+
+class InboundQueue(Poller):
+    """Durable inbound WhatsApp messages, answered in the background.
+
+    The webhook calls ``submit``, which stores the message in
+    ``whatsapp_inbound_messages`` before the provider gets its ack, so an
+    accepted message survives a crash or deploy. A claimer moves rows into
+    an in-process queue of ``maxsize`` (claimed with ``FOR UPDATE SKIP
+    LOCKED``, so several instances can share the table) and ``workers`` tasks
+    run ``handler(row)``, one row each at a time. Rows stay claimed until
+    ``complete`` is called once the reply went out; when the handler raises
+    the claim is released and the row is taken again by the next claim, and
+    a claim older than ``stale_after`` seconds (the instance died) is taken
+    again too, up to ``max_attempts`` attempts in all. Provider retries of a stored
+    message id are dropped by the unique ``message_id``.
+    """
+
+    def __init__(self, handler, get_pool, workers=20, maxsize=1000, poll_interval=5,
+                 stale_after=600, max_attempts=3, retention_hours=24):
+        super().__init__(poll_interval=poll_interval)
+        self.handler = handler
+        self.get_pool = get_pool
+        self.workers = workers
+        self.maxsize = maxsize
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.retention_hours = retention_hours
+        self._queue = None
+        self._workers = []
+        self._rounds = 0
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        super().start()
+
+    async def stop(self, timeout=10):
+        # Stop claiming first; rows still in memory are claimed again after stale_after
+        await super().stop()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self._queue.qsize()} inbound message(s) left for another instance on shutdown")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def submit(self, mobile, body, message_id=None):
+        """Store a message; returns False if ``message_id`` was already received"""
+        row_id = await self.get_pool().fetchval(INSERT_MESSAGE_QUERY, message_id, mobile, body)
+        if row_id is None:
+            return False
+        self.wake()
+        return True
+
+    async def complete(self, ids):
+        ids = [row_id for row_id in ids if row_id is not None]
+        if ids:
+            await self.get_pool().execute(COMPLETE_MESSAGES_QUERY, ids)
+
+    async def release(self, ids):
+        ids = [row_id for row_id in ids if row_id is not None]
+        if ids:
+            await self.get_pool().execute(RELEASE_MESSAGES_QUERY, ids)
+
+    async def run_once(self):
+        free = self.maxsize - self._queue.qsize()
+        rows = []
+        if free > 0:
+            rows = await self.get_pool().fetch(CLAIM_MESSAGES_QUERY, free, self.stale_after, self.max_attempts)
+            for row in rows:
+                self._queue.put_nowait(dict(row))
+        self._rounds += 1
+        if self._rounds % 720 == 0:
+            await self.get_pool().execute(PURGE_MESSAGES_QUERY, self.retention_hours, self.max_attempts)
+        if rows and len(rows) >= free:
+            # More may be waiting; go again once the workers made room
+            await asyncio.sleep(0.1)
+            return True
+        return False
+
+    async def _work(self):
+        while True:
+            row = await self._queue.get()
+            try:
+                await self.handler(row)
+            except Exception as e:
+                logger.error(f"Error handling inbound message {row['id']}: {e}")
+                try:
+                    await self.release([row["id"]])
+                except Exception as e:
+                    logger.error(f"Could not release inbound message {row['id']}: {e}")
+            finally:
+                self._queue.task_done()
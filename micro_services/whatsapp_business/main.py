@@ -1,13 +1,25 @@
 # assistant_outreach_service/main.py
 
 from fastapi import FastAPI, HTTPException, Request
-import requests
 from pydantic import BaseModel
 from typing import Optional
 from openai import OpenAI
 import os
 import asyncpg
+import asyncio
+import json
 from app.config import settings
+from micro_services.whatsapp_business.assistants_client import assistants_client, RunTimeoutError
+from micro_services.whatsapp_business.inbound import InboundQueue
+from micro_services.whatsapp_business.scheduler import ConversationScheduler
+from micro_services.whatsapp_business.negotiation_writer import NegotiationWriter
+from micro_services.whatsapp_business.assistant_jobs import AssistantJobWorker
+from micro_services.whatsapp_business.chat_history import ChatHistoryStore
+from helpers.http_helper import PooledHTTPClient
+from app.services.conversation_routes import CONVERSATION_ROUTES_CHANNEL
+from app.services.campaign_assistants import CAMPAIGN_ASSISTANTS_CHANNEL
+from app.services.chat_history import CHAT_SYNC_CHANNEL
+from cachetools import TTLCache
 # Load environment variables (replace with actual values or load from .env)
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY,default_headers={"OpenAI-Beta": "assistants=v2"})
@@ -17,28 +29,6 @@ app = FastAPI()
 # PostgreSQL connection
 CHAT_DATABASE_URL = os.getenv("CHAT_DATABASE_URL")
 
-functions=[
-  {
-    "name": "update_outreach_status",
-    "description": "Update the status of outreach lifecycle in the database",
-    "parameters": {
-      "type": "object",
-      "properties": {
-        "creator_id": {"type": "string"},
-        "campaign_id": {"type": "string"},
-        "status": {
-          "type": "string",
-          "enum": ["faq_answered", "negotiation_started", "price_agreed", "deal_closed"]
-        },
-        "final_price": {"type": "number"},
-        "deliverables": {"type": "string"},
-        "timeline": {"type": "string"}
-      },
-      "required": ["creator_id", "campaign_id", "status"]
-    }
-  }
-]
-
 class WhatsAppMessage(BaseModel):
     mobile_number: str
     message: str
@@ -59,19 +49,43 @@ class Campaign(BaseModel):
     budget: float
 
 
+whatsapp_http = PooledHTTPClient(timeout=settings.WHATSAPP_HTTP_TIMEOUT)
+
+# mobile -> {creator_id, campaign_id, campaign_creator_id, assistant_id, thread_id}
+route_cache = TTLCache(maxsize=50_000, ttl=settings.CONVERSATION_ROUTE_CACHE_TTL)
+
+
 @app.on_event("startup")
 async def startup():
     app.state.db = await asyncpg.create_pool(settings.CHAT_DATABASE_URL)
+    # Dedicated connection: LISTEN needs to stay on one session
+    app.state.route_listener = await asyncpg.connect(settings.CHAT_DATABASE_URL)
+    await app.state.route_listener.add_listener(CONVERSATION_ROUTES_CHANNEL, on_route_change)
+    await app.state.route_listener.add_listener(
+        CAMPAIGN_ASSISTANTS_CHANNEL, lambda *args: assistant_worker.wake()
+    )
+    await app.state.route_listener.add_listener(
+        CHAT_SYNC_CHANNEL, lambda connection, pid, channel, thread_id: chat_history.schedule_sync(thread_id)
+    )
+    inbound_queue.start()
+    assistant_worker.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    await assistant_worker.stop()
+    await inbound_queue.stop()
+    await conversation_scheduler.stop()
+    await negotiation_writer.close()
+    await assistants_client.aclose()
+    await whatsapp_http.aclose()
+    await app.state.route_listener.close()
     await app.state.db.close()
 
 from app.config import settings
 
 
-def send_whatsapp_message(to_number: str, message: str):
+async def send_whatsapp_message(to_number: str, message: str):
     url = f"{settings.WHATSAPP_API_URL}"
     headers = {"Authorization": f"Bearer {settings.WHATSAPP_AGENT_API_TOKEN}"}
     data = {
@@ -86,169 +100,278 @@ def send_whatsapp_message(to_number: str, message: str):
         "text": {"body": message}
 
     }
-    requests.post(url, json=data, headers=headers)
+    response = await whatsapp_http.post(url, json=data, headers=headers)
+    response.raise_for_status()
+
+
+ROUTE_QUERY = """
+    select creator_id, campaign_id, campaign_creator_id, assistant_id, thread_id
+    from conversation_routes where mobile = $1
+"""
+
+# Fallback used to (re)build a route: latest active invitation for the number
+LEGACY_ROUTE_QUERY = """
+    select cc.creator_id, cc.campaign_id, cc.id as campaign_creator_id, c.assistant_id, cc.thread_id
+    from outreach_logs o
+    join campaign_creators cc on cc.id = o.campaign_creator_id
+    join campaigns c on c.id = cc.campaign_id
+    where o.outreach_type = 'WHATSAPP'
+      and o.recipient_contact = $1
+      and cc.status in ('ACCEPTED', 'INVITED', 'IN_PROGRESS')
+    order by o.id desc
+    limit 1
+"""
+
+UPSERT_ROUTE_QUERY = """
+    insert into conversation_routes (mobile, creator_id, campaign_id, campaign_creator_id, assistant_id, thread_id, updated_at)
+    values ($1, $2, $3, $4, $5, $6, now())
+    on conflict (mobile) do update set
+        creator_id = excluded.creator_id,
+        campaign_id = excluded.campaign_id,
+        campaign_creator_id = excluded.campaign_creator_id,
+        assistant_id = excluded.assistant_id,
+        thread_id = excluded.thread_id,
+        updated_at = now()
+"""
+
+
+def on_route_change(connection, pid, channel, payload):
+    # NOTIFY from the API (or another instance) after an invitation or assistant change
+    if payload == "*":
+        route_cache.clear()
+    else:
+        route_cache.pop(payload, None)
+
+
 async def get_creator_by_mobile(mobile):
-    row = await app.state.db.fetchrow(
-        f"""
-        select 
-	outreach_logs.*,
-    campaign_creators.*,
-    creators.*,
-    campaigns.*,
-    campaign_creators.status as creator_status
-from 
-	outreach_logs
-left join 
-	campaign_creators
-ON
-	campaign_creators.id = outreach_logs.campaign_creator_id
-left join
-	creators
-ON
-	creators.id = campaign_creators.creator_id
-left join
-	campaigns
-ON
-	campaigns.id = campaign_creators.campaign_id
-WHERE
-	outreach_logs.outreach_type = 'WHATSAPP'
-AND
-	campaign_creators.status IN ('ACCEPTED', 'INVITED', 'IN_PROGRESS')
-AND
-	outreach_logs.recipient_contact = '{mobile}'
-limit 1
-        """
-    )
-    print(f"Fetched creator data: {row} for mobile {mobile}")
-    return row
+    route = route_cache.get(mobile)
+    if route is not None:
+        return route
+
+    row = await app.state.db.fetchrow(ROUTE_QUERY, mobile)
+    if row is None:
+        row = await app.state.db.fetchrow(LEGACY_ROUTE_QUERY, mobile)
+        if row is None:
+            print(f"No conversation found for mobile {mobile}")
+            return None
+        await app.state.db.execute(
+            UPSERT_ROUTE_QUERY, mobile, row["creator_id"], row["campaign_id"],
+            row["campaign_creator_id"], row["assistant_id"], row["thread_id"]
+        )
+
+    route = dict(row)
+    route_cache[mobile] = route
+    print(f"Fetched creator data: {route} for mobile {mobile}")
+    return route
+
 
+# mobile -> in-flight thread creation, shared by every message of a burst
+thread_creations = {}
 
-async def create_thread_if_not_exist(creator_id, campaign_id):
+
+async def create_thread_if_not_exist(mobile, route):
+    if route["thread_id"]:
+        return route["thread_id"]
+
+    creation = thread_creations.get(mobile)
+    if creation is None:
+        creation = thread_creations[mobile] = asyncio.ensure_future(create_thread(mobile, route))
+        creation.add_done_callback(lambda _: thread_creations.pop(mobile, None))
+    # Shielded: a cancelled waiter must not cancel the creation the others wait on
+    return await asyncio.shield(creation)
+
+
+async def create_thread(mobile, route):
+    creator_id, campaign_id = route["creator_id"], route["campaign_id"]
     row = await app.state.db.fetchrow("SELECT thread_id FROM campaign_creators WHERE creator_id=$1 AND campaign_id=$2", creator_id, campaign_id)
     if row['thread_id']:
         print(f"Thread already exists for creator {creator_id} and campaign {campaign_id}: {row['thread_id']}")
+        route["thread_id"] = row["thread_id"]
         return row["thread_id"]
 
-    thread_response = requests.post("https://api.openai.com/v1/threads",
-        headers={
-            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        }
-    )
-    thread = thread_response.json()
+    thread = await assistants_client.create_thread()
     print(f"Created new thread: {thread}")
-    await app.state.db.execute(
-        "UPDATE campaign_creators SET thread_id=$3 WHERE creator_id=$1 AND campaign_id=$2",
-        creator_id, campaign_id, thread["id"]
-    )
-    return thread["id"]
+    thread_id = thread["id"]
+    async with app.state.db.acquire() as connection:
+        async with connection.transaction():
+            updated = await connection.execute(
+                "UPDATE campaign_creators SET thread_id=$3 WHERE creator_id=$1 AND campaign_id=$2 AND thread_id IS NULL",
+                creator_id, campaign_id, thread_id
+            )
+            if updated == "UPDATE 0":
+                # Another service instance got there first: use its thread so history stays in one place
+                thread_id = await connection.fetchval(
+                    "SELECT thread_id FROM campaign_creators WHERE creator_id=$1 AND campaign_id=$2",
+                    creator_id, campaign_id
+                )
+                print(f"Discarding thread {thread['id']}, {mobile} already uses {thread_id}")
+            await connection.execute(
+                "UPDATE conversation_routes SET thread_id=$2, updated_at=now() WHERE mobile=$1",
+                mobile, thread_id
+            )
+            await connection.execute("SELECT pg_notify($1, $2)", CONVERSATION_ROUTES_CHANNEL, mobile)
+    route["thread_id"] = thread_id
+    return thread_id
+
+
+async def submit_message(payload: WhatsAppMessage, send_reply: bool, inbound_id=None):
+    """Queue the message on its thread's lane; returns a future for the reply text"""
+    creator_data = await get_creator_by_mobile(payload.mobile_number)
+
+    if not creator_data:
+        raise HTTPException(status_code=404, detail="Creator or campaign not found")
+
+    thread_id = await create_thread_if_not_exist(payload.mobile_number, creator_data)
+    return conversation_scheduler.submit(thread_id, {
+        "payload": payload,
+        "assistant_id": creator_data["assistant_id"],
+        "campaign_creator_id": creator_data["campaign_creator_id"],
+        "send_reply": send_reply,
+        "inbound_id": inbound_id,
+    })
 
 
 @app.post("/whatsapp-webhook")
 async def handle_whatsapp_message(payload: WhatsAppMessage):
-    creator_data = await get_creator_by_mobile(payload.mobile_number)
+    reply = await submit_message(payload, send_reply=False)
+    return {"reply": await reply}
 
-    if not creator_data:
-        raise HTTPException(status_code=404, detail="Creator or campaign not found")
 
+async def reply_to_whatsapp_message(row):
+    """Inbound queue worker: hand the stored message to its thread and wait until the reply went out"""
+    payload = WhatsAppMessage(mobile_number=row["mobile"], message=row["body"])
+    try:
+        reply = await submit_message(payload, send_reply=True, inbound_id=row["id"])
+    except HTTPException as e:
+        print(f"No reply for {payload.mobile_number}: {e.detail}")
+        # Nothing to answer it with; don't retry
+        await inbound_queue.complete([row["id"]])
+        return
+    # Waiting keeps WHATSAPP_INBOUND_WORKERS a bound on replies in flight; a failed
+    # turn raises here and the inbound queue releases the message for a retry
+    await reply
+
+
+inbound_queue = InboundQueue(
+    reply_to_whatsapp_message,
+    lambda: app.state.db,
+    workers=settings.WHATSAPP_INBOUND_WORKERS,
+    maxsize=settings.WHATSAPP_INBOUND_QUEUE_SIZE,
+    stale_after=settings.WHATSAPP_INBOUND_STALE_AFTER,
+    max_attempts=settings.WHATSAPP_INBOUND_MAX_ATTEMPTS,
+)
+
+
+def execute_tool_call(campaign_creator_id, tool_call):
+    """Apply one function call from the assistant and return its tool output"""
+    function = tool_call["function"]
+    try:
+        if function["name"] != "update_outreach_status":
+            raise ValueError(f"Unknown function '{function['name']}'")
+        arguments = json.loads(function["arguments"] or "{}")
+        # The invitation comes from the conversation route, not from the model's ids
+        negotiation_writer.record(
+            campaign_creator_id,
+            arguments.get("status"),
+            final_price=arguments.get("final_price"),
+            deliverables=arguments.get("deliverables"),
+            timeline=arguments.get("timeline"),
+        )
+        output = {"success": True}
+    except (ValueError, TypeError) as e:
+        print(f"Tool call {tool_call['id']} rejected: {e}")
+        output = {"success": False, "error": str(e)}
+    return {"tool_call_id": tool_call["id"], "output": json.dumps(output)}
 
-    thread_id = await create_thread_if_not_exist(creator_data['creator_id'], creator_data['campaign_id'])
 
-    # Post creator message to thread
-    message_response = requests.post(f"https://api.openai.com/v1/threads/{thread_id}/messages",
-        headers={
-            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        },
-        json={
-            "role": "user",
-            "content": payload.message
-        }
-    )
+negotiation_writer = NegotiationWriter(
+    lambda: app.state.db,
+    max_rows=settings.NEGOTIATION_FLUSH_ROWS,
+    flush_interval=settings.NEGOTIATION_FLUSH_INTERVAL_MS / 1000,
+)
+
+
+async def run_conversation_turn(thread_id, items):
+    """One assistant run answering every message queued on the thread since the last run"""
+    # A burst of messages goes in as a single user message
+    await assistants_client.add_message(thread_id, "\n".join(item["payload"].message for item in items))
 
     # Run the assistant on this thread
-    run_response = requests.post(f"https://api.openai.com/v1/threads/{thread_id}/runs",
-        headers={
-            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        },
-        json={
-            "assistant_id": creator_data["assistant_id"]
-        }
-    )
-    run = run_response.json()
-    print(f"Run started: {run}")
-    # Wait or poll run status until complete (simplified here)
-    import time
-    while True:
-        run_status_response = requests.get(f"https://api.openai.com/v1/threads/{thread_id}/runs/{run['id']}",
-            headers={
-                "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                "OpenAI-Beta": "assistants=v2"
-            }
-        )
-        run_status = run_status_response.json()
-        if run_status["status"] == "completed":
-            break
-        elif run_status["status"] == "failed":
-            raise HTTPException(status_code=500, detail="Run failed")
-        time.sleep(1)
-
-    messages_response = requests.get(f"https://api.openai.com/v1/threads/{thread_id}/messages",
-        headers={
-            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-            "OpenAI-Beta": "assistants=v2"
-        }
-    )
-    messages = messages_response.json()
-    
-    # Find the last assistant message
-    last_message = None
-    for message in messages["data"]:
-        if message["role"] == "assistant":
-            last_message = message
-            break
-    
-    if last_message and last_message["content"]:
-        response_text = last_message["content"][0]["text"]["value"]
-    else:
+    run = await assistants_client.create_run(thread_id, items[-1]["assistant_id"])
+    print(f"Run started: {run} for {len(items)} message(s)")
+    try:
+        run = await assistants_client.wait_for_run(thread_id, run["id"])
+        while run["status"] == "requires_action":
+            tool_calls = run["required_action"]["submit_tool_outputs"]["tool_calls"]
+            tool_outputs = [execute_tool_call(items[-1]["campaign_creator_id"], call) for call in tool_calls]
+            run = await assistants_client.submit_tool_outputs(thread_id, run["id"], tool_outputs)
+            run = await assistants_client.wait_for_run(thread_id, run["id"])
+    except RunTimeoutError as e:
+        print(e)
+        # Free the thread for the next message
+        await assistants_client.cancel_run(thread_id, run["id"])
+        raise HTTPException(status_code=504, detail="Run timed out")
+    if run["status"] != "completed":
+        raise HTTPException(status_code=500, detail=f"Run {run['status']}")
+
+    response_text = await assistants_client.latest_reply(thread_id, run_id=run["id"])
+    if not response_text:
         response_text = "Sorry, I couldn't process that."
-    return {"reply": response_text}
 
+    for mobile in {item["payload"].mobile_number for item in items if item["send_reply"]}:
+        await send_whatsapp_message(mobile, response_text)
+    # Answered: stored inbound messages are not retried from here on
+    await inbound_queue.complete([item["inbound_id"] for item in items])
 
-@app.post("/create-campaign-assistant")
-async def create_campaign_assistant(campaign: Campaign):
-    system_prompt = f"""
-    You are an outreach agent for the campaign "{campaign.title}".
-    Campaign Description: {campaign.description}
-    Budget: {campaign.budget}
-    Answer questions, negotiate prices within the budget, and close deals with creators.
-    """
-
-    assistant = requests.post("https://api.openai.com/v1/assistants",
-        headers={
-            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-            "OpenAI-Beta": "assistants=v2"
-        },
-        json={
-            "name" :f"Assistant for {campaign.title}",
-            "instructions" : system_prompt,
-            "tools" : [{"type": "function", "function": functions[0]}],  # Pass the function directly, not the array
-            "model" : "gpt-3.5-turbo"
-        }
-    )
-    assistant = assistant.json()
-    print(assistant)
-    await app.state.db.execute(
-        "UPDATE campaigns SET assistant_id=$1 WHERE id=$2",
-        assistant.get("id"), campaign.id
-    )
+    # Store the turn for the dashboard; still inside the lane, so it can't race the next run
+    try:
+        await chat_history.sync(thread_id)
+    except Exception as e:
+        print(f"Chat history sync of {thread_id} failed: {e}")
+    return response_text
+
+
+chat_history = ChatHistoryStore(lambda: app.state.db)
+
+
+conversation_scheduler = ConversationScheduler(
+    run_conversation_turn,
+    max_concurrency=settings.WHATSAPP_MAX_CONCURRENT_RUNS,
+    coalesce_window=settings.WHATSAPP_COALESCE_WINDOW_MS / 1000,
+)
+
+
+assistant_worker = AssistantJobWorker(
+    lambda: app.state.db,
+    poll_interval=settings.ASSISTANT_JOB_POLL_INTERVAL,
+    stale_after=settings.ASSISTANT_JOB_STALE_AFTER,
+)
 
-    return {"assistant_id": assistant.get("id")}
+CAMPAIGN_ASSISTANT_STATUS_QUERY = """
+    select campaign_id, status, assistant_id, error, requested_at, updated_at
+    from campaign_assistants where campaign_id = $1
+"""
+
+
+@app.post("/create-campaign-assistant", status_code=202)
+async def create_campaign_assistant(campaign: Campaign):
+    """Queue provisioning of the campaign's assistant; poll the status endpoint for the result"""
+    await app.state.db.execute("""
+        insert into campaign_assistants (campaign_id, status, requested_at, updated_at)
+        values ($1, 'pending', now(), now())
+        on conflict (campaign_id) do update set
+            status = 'pending', error = null, requested_at = now(), updated_at = now()
+    """, campaign.id)
+    assistant_worker.wake()
+    return dict(await app.state.db.fetchrow(CAMPAIGN_ASSISTANT_STATUS_QUERY, campaign.id))
+
+
+@app.get("/campaign-assistants/{campaign_id}")
+async def get_campaign_assistant(campaign_id: int):
+    row = await app.state.db.fetchrow(CAMPAIGN_ASSISTANT_STATUS_QUERY, campaign_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="No assistant requested for this campaign")
+    return dict(row)
 
 @app.get("/whatsapp_bothook")
 async def setwebhook(request: Request):
@@ -262,11 +385,14 @@ async def webhook(request: Request):
         msgpayload=data.get("entry")[0].get("changes")[0].get("value").get("messages")[0]
     except:
         return {"status":"ignored"}
-    if msgpayload.get("type")=="text":
-        message = msgpayload.get("text").get("body")
-        contact_number=msgpayload.get("from")
-        response_txt = requests.post("http://localhost:8001/whatsapp-webhook",json={
-            "message": message,
-            "mobile_number": contact_number
-        })
-        await send_whatsapp_message(msgpayload.get("from"), response_txt.json().get("reply"))
\ No newline at end of file
+    if msgpayload.get("type")!="text":
+        return {"status":"ignored"}
+
+    # Ack once stored; the assistant run and the reply happen on the inbound workers.
+    # A failed insert surfaces as an error, so the provider retries.
+    accepted = await inbound_queue.submit(
+        msgpayload.get("from"),
+        msgpayload.get("text").get("body"),
+        message_id=msgpayload.get("id")
+    )
+    return {"status": "accepted" if accepted else "duplicate"}
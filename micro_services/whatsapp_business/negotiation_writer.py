@@ -0,0 +1,108 @@
+from helpers.buffered_writer_helper import BufferedWriter
+
+# Lifecycle reported by the assistant's update_outreach_status tool, in order
+OUTREACH_STAGES = ["faq_answered", "negotiation_started", "price_agreed", "deal_closed"]
+
+# Stage -> negotiations.status (enum member name); faq_answered writes nothing
+NEGOTIATION_STATUS = {
+    "negotiation_started": "INITIATED",
+    "price_agreed": "ACCEPTED",
+    "deal_closed": "ACCEPTED",
+}
+
+INSERT_NEGOTIATIONS_QUERY = """
+    insert into negotiations (campaign_creator_id, proposed_rate, status, created_at)
+    select cc.id, coalesce(v.price, cc.offered_rate), 'INITIATED'::negotiationstatus, now()
+    from unnest($1::int[], $2::float8[]) as v(id, price)
+    join campaign_creators cc on cc.id = v.id
+    where not exists (select 1 from negotiations n where n.campaign_creator_id = v.id)
+"""
+
+# Latest negotiation per invitation; an accepted one is not reopened
+UPDATE_NEGOTIATIONS_QUERY = """
+    update negotiations as n set
+        status = case
+            when n.status = 'ACCEPTED' and v.status = 'INITIATED' then n.status
+            else v.status::negotiationstatus
+        end,
+        final_rate = case when v.status = 'ACCEPTED' then coalesce(v.price, n.final_rate) else n.final_rate end,
+        counter_rate = case when v.status = 'INITIATED' then coalesce(v.price, n.counter_rate) else n.counter_rate end,
+        terms_and_conditions = coalesce(v.terms, n.terms_and_conditions),
+        updated_at = now()
+    from unnest($1::int[], $2::text[], $3::float8[], $4::text[]) as v(id, status, price, terms)
+    where n.id = (select max(id) from negotiations where campaign_creator_id = v.id)
+"""
+
+UPDATE_CAMPAIGN_CREATORS_QUERY = """
+    update campaign_creators as cc set
+        negotiated_rate = coalesce(v.negotiated_rate, cc.negotiated_rate),
+        final_rate = coalesce(v.final_rate, cc.final_rate),
+        status = case when v.closed and cc.status = 'INVITED' then 'ACCEPTED'::campaigncreatorstatus else cc.status end,
+        accepted_at = case when v.closed and cc.status = 'INVITED' then now() else cc.accepted_at end
+    from unnest($1::int[], $2::float8[], $3::float8[], $4::bool[]) as v(id, negotiated_rate, final_rate, closed)
+    where cc.id = v.id
+"""
+
+
+class NegotiationWriter(BufferedWriter):
+    """Buffers negotiation outcomes reported by the assistant and writes them in batches.
+
+    ``record`` is called for every ``update_outreach_status`` tool call and
+    returns at once, so the run can continue; outcomes are merged per
+    invitation (furthest stage wins, latest non-empty price and terms win)
+    and flushed in one transaction every ``flush_interval`` seconds or once
+    ``max_rows`` invitations are buffered.
+    """
+
+    def __init__(self, get_pool, max_rows=200, flush_interval=0.5):
+        super().__init__(max_rows=max_rows, flush_interval=flush_interval)
+        self.get_pool = get_pool
+
+    def record(self, campaign_creator_id, status, final_price=None, deliverables=None, timeline=None):
+        if status not in OUTREACH_STAGES:
+            raise ValueError(f"Unknown outreach status '{status}'")
+        # Arguments come from the model: coerce here so a bad value can't break a whole batch
+        self._buffer(campaign_creator_id, {
+            "stage": OUTREACH_STAGES.index(status),
+            "final_price": float(final_price) if final_price is not None else None,
+            "deliverables": str(deliverables) if deliverables else None,
+            "timeline": str(timeline) if timeline else None,
+        })
+
+    @staticmethod
+    def _merge(current, update):
+        if current is None:
+            return update
+        merged = {key: update[key] if update[key] is not None else current[key] for key in update}
+        merged["stage"] = max(current["stage"], update["stage"])
+        return merged
+
+    async def _write(self, rows):
+        negotiations = []
+        campaign_creators = []
+        for campaign_creator_id, row in rows.items():
+            stage = OUTREACH_STAGES[row["stage"]]
+            if stage not in NEGOTIATION_STATUS:
+                continue
+            terms = "\n".join(
+                f"{label}: {row[key]}" for label, key in (("Deliverables", "deliverables"), ("Timeline", "timeline"))
+                if row[key]
+            ) or None
+            negotiations.append((campaign_creator_id, NEGOTIATION_STATUS[stage], row["final_price"], terms))
+            campaign_creators.append((
+                campaign_creator_id,
+                row["final_price"] if stage == "price_agreed" else None,
+                row["final_price"] if stage == "deal_closed" else None,
+                stage == "deal_closed",
+            ))
+        if not negotiations:
+            return
+
+        ids, statuses, prices, terms = (list(column) for column in zip(*negotiations))
+        async with self.get_pool().acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(INSERT_NEGOTIATIONS_QUERY, ids, prices)
+                await connection.execute(UPDATE_NEGOTIATIONS_QUERY, ids, statuses, prices, terms)
+                await connection.execute(
+                    UPDATE_CAMPAIGN_CREATORS_QUERY, *(list(column) for column in zip(*campaign_creators))
+                )
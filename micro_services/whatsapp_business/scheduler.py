@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationScheduler:
+    """Runs conversation turns one at a time per thread, many threads at once.
+
+    The Assistants API rejects a run on a thread that already has an active
+    one, so each ``key`` (thread id) gets its own lane: items submitted while
+    a turn is running, or within ``coalesce_window`` seconds of each other,
+    are handed to ``runner(key, items)`` together as a single turn. Lanes of
+    different threads run in parallel, with at most ``max_concurrency``
+    turns in flight across the process.
+
+    ``submit`` returns a future resolved with the turn's result (shared by
+    every item coalesced into it).
+    """
+
+    def __init__(self, runner, max_concurrency=50, coalesce_window=0.75):
+        self.runner = runner
+        self.coalesce_window = coalesce_window
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending = {}
+        self._lanes = {}
+
+    @property
+    def active_lanes(self):
+        return len(self._lanes)
+
+    def submit(self, key, item):
+        future = asyncio.get_running_loop().create_future()
+        # Fire-and-forget callers never read the result; don't warn about it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending.setdefault(key, []).append((item, future))
+        if key not in self._lanes:
+            self._lanes[key] = asyncio.create_task(self._run_lane(key))
+        return future
+
+    async def stop(self, timeout=30):
+        lanes = list(self._lanes.values())
+        if lanes:
+            _, still_running = await asyncio.wait(lanes, timeout=timeout)
+            if still_running:
+                logger.warning(f"{len(still_running)} conversation turn(s) cancelled on shutdown")
+            for task in still_running:
+                task.cancel()
+            await asyncio.gather(*lanes, return_exceptions=True)
+
+    async def _run_lane(self, key):
+        batch = []
+        try:
+            while self._pending.get(key):
+                # Let a burst of messages land before starting the run
+                await asyncio.sleep(self.coalesce_window)
+                batch = self._pending.pop(key)
+                async with self._slots:
+                    try:
+                        result = await self.runner(key, [item for item, _ in batch])
+                    except Exception as e:
+                        logger.error(f"Conversation turn failed for {key}: {e}")
+                        for _, future in batch:
+                            if not future.done():
+                                future.set_exception(e)
+                        continue
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._lanes.pop(key, None)
+            # Only non-empty when the lane was cancelled
+            for _, future in batch + self._pending.pop(key, []):
+                if not future.done():
+                    future.cancel()
@@ -1,39 +1,63 @@
 from app.config import settings
-from helpers.queue_helper import create_queue
-from micro_services.whatsapp_service.whatsapp_helper import send_whatsapp_outreach_message_to_creator
-from app.database import AsyncSession
-import time
-import asyncio
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from app.database import get_db_session
-from app.config import settings
-
-DATABASE_URL = settings.DATABASE_URL  # Ensure this is correctly set in your config
+from helpers.queue_helper import create_queue, RetryPolicy
+from helpers.consumer_helper import QueueConsumer, recipient_key
+from micro_services.whatsapp_service.whatsapp_helper import send_whatsapp_outreach_message_to_creator, rate_limiter, http_client
+from app.database import AsyncSessionLocal
+from helpers.status_writer_helper import OutreachStatusWriter
+from helpers.dedup_helper import DedupStore, DUPLICATE, IN_PROGRESS
 
-# Create the database engine
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+status_writer = OutreachStatusWriter(
+    AsyncSessionLocal,
+    max_rows=settings.OUTREACH_STATUS_FLUSH_ROWS,
+    flush_interval=settings.OUTREACH_STATUS_FLUSH_INTERVAL_MS / 1000,
+)
 
-# Create the session factory
-async_session = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
+dedup_store = DedupStore(
+    settings.REDIS_URL,
+    namespace="whatsapp",
+    processing_ttl=settings.OUTREACH_DEDUP_PROCESSING_TTL,
+    sent_ttl=settings.OUTREACH_DEDUP_SENT_TTL,
 )
+
+
 async def fetch_and_process_whatsapp_outreach(outreach_id):
         try:
-            db_session = await get_db_session()
-            # Pass the database session explicitly to the function
-            result = await send_whatsapp_outreach_message_to_creator(outreach_id, db_session)
+            # Sessions come from the shared engine pool of this long-lived loop
+            async with AsyncSessionLocal() as db_session:
+                result = await send_whatsapp_outreach_message_to_creator(outreach_id, db_session)
             if result:
                 print(f"Successfully processed outreach ID: {outreach_id}")
             else:
                 print(f"Failed to process outreach ID: {outreach_id}")
+            return result
         except Exception as e:
             print(f"Error processing outreach ID {outreach_id}: {e}")
+            return False
 
 
-def consume():
+async def handle_payload(payload):
+    print(f"whatsapp payload : {payload}")
+    outreach_id = payload.get("outreach_id")
+    status = payload.get("status")
+    if outreach_id is None or status != "initiated":
+        return None
+
+    claim = await dedup_store.claim(outreach_id)
+    if claim == DUPLICATE:
+        print(f"Outreach {outreach_id} was already sent, skipping redelivery")
+        return None
+    if claim == IN_PROGRESS:
+        # Another worker holds the claim; retry later in case it fails
+        return False
+
+    print(f"Sending whatsapp outreach for {outreach_id} with status {status}")
+    result = await fetch_and_process_whatsapp_outreach(outreach_id)
+    await dedup_store.settle({outreach_id: result})
+    status_writer.record_results({outreach_id: result})
+    return result
+
+
+def build_consumer():
 
     queue = create_queue(
         queue_name=settings.WHATSAPP_QUEUE_NAME,
@@ -41,26 +65,27 @@ def consume():
         port=settings.RABBITMQ_PORT,
         user=settings.RABBITMQ_USER,
         password=settings.RABBITMQ_PASSWORD,
-        vhost=settings.RABBITMQ_VHOST
+        vhost=settings.RABBITMQ_VHOST,
+        retry_policy=RetryPolicy(
+            max_retries=settings.WHATSAPP_QUEUE_MAX_RETRIES,
+            base_delay=settings.WHATSAPP_QUEUE_RETRY_BASE_DELAY,
+            max_delay=settings.QUEUE_RETRY_MAX_DELAY,
+        )
+    )
+    return QueueConsumer(
+        queue,
+        handle_payload,
+        concurrency=settings.WHATSAPP_CONSUMER_CONCURRENCY,
+        metrics_port=settings.WHATSAPP_CONSUMER_METRICS_PORT + settings.CONSUMER_WORKER_INDEX,
+        drain_timeout=settings.CONSUMER_DRAIN_TIMEOUT,
+        depth_check_interval=settings.QUEUE_DEPTH_CHECK_INTERVAL,
+        on_shutdown=[status_writer.close, dedup_store.close, rate_limiter.close, http_client.aclose],
+        ordering_key=recipient_key,
+        on_dead_letter=status_writer.record_dead_letter,
     )
 
-    while True:
-        try:
-            payload = queue.get()
-            if payload:
-                print(f"whatsapp payload : {payload}")
-                outreach_id = payload["outreach_id"]
-                status = payload["status"]
-                if status == "initiated":
-                    print(f"Sending whatsapp outreach for {outreach_id} with status {status}")
-                    asyncio.run(fetch_and_process_whatsapp_outreach(outreach_id))
-            else:
-                pass
-                # print("No messages in the whatsapp queue, waiting...")
-        except Exception as e:
-            print(f"Error consuming message: {e}")
-        finally:
-            time.sleep(1)
+def consume():
+    build_consumer().run()
 
 if __name__ == "__main__":
-    consume()
\ No newline at end of file
+    consume()
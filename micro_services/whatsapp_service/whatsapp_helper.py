@@ -1,61 +1,75 @@
 from app.models import OutreachLog
 from app.services.email_service import EmailService
 from sqlalchemy import select, text
+from cachetools import TTLCache
 from datetime import timedelta
 from typing import List
-import requests
 from app.config import settings
+from helpers.token_bucket_helper import TokenBucket
+from helpers.http_helper import PooledHTTPClient
+
+rate_limiter = TokenBucket(
+    settings.REDIS_URL,
+    name=f"whatsapp:{settings.WHATSAPP_SENDER_ID}",
+    rate=settings.WHATSAPP_SEND_RATE_PER_SECOND,
+    capacity=settings.WHATSAPP_SEND_BURST,
+)
+
+# Shared keep-alive connections to the WhatsApp provider for the whole process
+http_client = PooledHTTPClient(
+    timeout=settings.WHATSAPP_HTTP_TIMEOUT,
+    max_concurrency=settings.WHATSAPP_HTTP_MAX_CONCURRENCY,
+)
+
+
+# Campaign fields are the same for every creator of a campaign
+campaign_cache = TTLCache(maxsize=1024, ttl=settings.WHATSAPP_CAMPAIGN_CACHE_TTL)
+
+OUTREACH_RECIPIENT_QUERY = text("""
+    select o.recipient_contact, cc.campaign_id, cr.full_name
+    from outreach_logs o
+    join campaign_creators cc on cc.id = o.campaign_creator_id
+    join creators cr on cr.id = cc.creator_id
+    where o.id = :outreach_id and o.outreach_type = 'WHATSAPP'
+""")
+
+CAMPAIGN_QUERY = text("""
+    select title, description, brand_name from campaigns where id = :campaign_id
+""")
+
+
+async def fetch_campaign(campaign_id, db):
+    campaign = campaign_cache.get(campaign_id)
+    if campaign is None:
+        result = await db.execute(CAMPAIGN_QUERY, {"campaign_id": campaign_id})
+        campaign = result.fetchone()
+        if campaign:
+            campaign_cache[campaign_id] = campaign
+    return campaign
 
 
 async def send_whatsapp_outreach_message_to_creator(outreach_id, db):
-    query = text(f"""
-        select * from outreach_logs where id = {outreach_id} and outreach_type = 'WHATSAPP'
-    """)
     try:
-        result = await db.execute(query)
-        outreach = result.mappings().fetchone()
+        result = await db.execute(OUTREACH_RECIPIENT_QUERY, {"outreach_id": outreach_id})
+        outreach = result.fetchone()
         if not outreach:
-            print(f"No outreach found for ID: {outreach_id}")
+            print(f"No outreach, campaign creator or influencer found for outreach ID: {outreach_id}")
             return False
 
         phone = outreach.recipient_contact
-        campaign_creator_id = outreach.campaign_creator_id
-
-        query = text(f"""
-            select * from campaign_creators where id = {campaign_creator_id}
-        """)
+        influencer_name = outreach.full_name
+        campaign_id = outreach.campaign_id
 
-        result = await db.execute(query)
-        campaign_creator = result.mappings().fetchone()
-        if not campaign_creator:
-            print(f"No campaign creator found for ID: {outreach_id}")
-            return False
-        
-        campaign_id = campaign_creator.campaign_id
-        creator_id = campaign_creator.creator_id
-
-        query = text(f"""
-            select * from campaigns where id = {campaign_id}
-        """)
-        result = await db.execute(query)
-        campaign = result.mappings().fetchone()
+        campaign = await fetch_campaign(campaign_id, db)
         if not campaign:
             print(f"No campaign found for ID: {campaign_id}")
             return False
-        
+
         campaign_details = campaign.description
         campaign_name = campaign.title
         brand_name = campaign.brand_name
-
-        query = text(f"""
-            select * from creators where id = {creator_id}
-        """)
-        result = await db.execute(query)
-        influencer = result.mappings().fetchone()
-        if not influencer:
-            print(f"No influencer found for ID: {creator_id}")
-            return False
-        influencer_name = influencer.full_name
+        # End the read-only transaction so the connection returns to the pool during the send
+        await db.rollback()
 
         try:
             whatsapp_agent_api_url = f"{settings.WHATSAPP_AGENT_API_URL}"
@@ -99,7 +113,9 @@ async def send_whatsapp_outreach_message_to_creator(outreach_id, db):
                 }
             }
             print(f"whatsapp Payload: {payload}")
-            response = requests.post(url=whatsapp_agent_api_url,headers=headers, json=payload)
+            # Wait for the sender number's budget instead of running into 429s
+            await rate_limiter.acquire()
+            response = await http_client.post(whatsapp_agent_api_url, headers=headers, json=payload)
 
             response.raise_for_status()
             print("WhatsApp message sent successfully.")
@@ -6,6 +6,10 @@ Run script for the FastAPI application and microservices
 
 import os
 import sys
+import math
+import glob
+import signal
+import argparse
 import uvicorn
 import subprocess
 import threading
@@ -32,15 +36,216 @@ def run_microservice(service_name, port, module_path):
     except Exception as e:
         print(f"❌ Error starting {service_name}: {e}")
 
-def run_consumer(service_name, module_path):
-    """Run a consumer script using module path"""
-    print(f"🔄 Starting {service_name} consumer...")
+def reset_metrics_dir(path):
+    """Empty a prometheus_client multiprocess directory; values of earlier runs would add up"""
+    os.makedirs(path, exist_ok=True)
+    for file in glob.glob(os.path.join(path, "*.db")):
+        os.remove(file)
+
+class ConsumerPool:
+    """A supervised pool of worker processes for one consumer type.
+
+    Crashed workers are restarted with exponential backoff, and the pool is
+    resized from the queue depth between ``min_workers`` and ``max_workers``.
+    Each worker gets a stable slot number (``CONSUMER_WORKER_INDEX``) so
+    per-process resources such as the metrics port do not collide. With
+    ``PROMETHEUS_MULTIPROC_DIR`` set, the workers of a pool share a
+    subdirectory named after the queue, so each of them serves the metrics
+    of the whole pool.
+    """
+
+    def __init__(self, service_name, module_path, queue_name, min_workers, max_workers, messages_per_worker,
+                 metrics_port):
+        self.service_name = service_name
+        self.module_path = module_path
+        self.queue_name = queue_name
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers, min_workers)
+        self.messages_per_worker = messages_per_worker
+        self.metrics_ports = range(metrics_port, metrics_port + self.max_workers)
+        self.metrics_dir = None
+        self.target = min_workers
+        self.workers = {}        # slot -> Popen
+        self.failures = {}       # slot -> consecutive crash count
+        self.restart_at = {}     # slot -> monotonic time before which the slot stays down
+        self.low_since = None
+
+    def spawn(self, slot):
+        env = {**os.environ, "CONSUMER_WORKER_INDEX": str(slot)}
+        if self.metrics_dir:
+            env["PROMETHEUS_MULTIPROC_DIR"] = self.metrics_dir
+        print(f"🔄 Starting {self.service_name} consumer worker #{slot}...")
+        self.workers[slot] = subprocess.Popen([sys.executable, "-m", self.module_path], env=env)
+
+    def reap(self):
+        for slot, process in list(self.workers.items()):
+            code = process.poll()
+            if code is None:
+                continue
+            del self.workers[slot]
+            if self.metrics_dir:
+                from prometheus_client import multiprocess
+                # Drops the dead worker's live gauges (e.g. messages in flight)
+                multiprocess.mark_process_dead(process.pid, self.metrics_dir)
+            if slot >= self.target:
+                continue
+            failures = self.failures.get(slot, 0) + 1
+            self.failures[slot] = failures
+            backoff = min(2 ** failures, 60)
+            self.restart_at[slot] = time.monotonic() + backoff
+            print(f"❌ {self.service_name} worker #{slot} exited with code {code}, restarting in {backoff}s")
+
+    def desired_workers(self, depth):
+        wanted = math.ceil(depth / self.messages_per_worker) if self.messages_per_worker else self.min_workers
+        return max(self.min_workers, min(self.max_workers, wanted))
+
+    def rescale(self, depth, scale_down_cooldown):
+        desired = self.desired_workers(depth)
+        if desired > self.target:
+            print(f"📈 Scaling {self.service_name} consumers {self.target} -> {desired} (queue depth {depth})")
+            self.target = desired
+            self.low_since = None
+        elif desired < self.target:
+            # Only shrink after the backlog has stayed low for a while
+            self.low_since = self.low_since or time.monotonic()
+            if time.monotonic() - self.low_since >= scale_down_cooldown:
+                print(f"📉 Scaling {self.service_name} consumers {self.target} -> {desired} (queue depth {depth})")
+                self.target = desired
+                self.low_since = None
+        else:
+            self.low_since = None
+
+    def converge(self):
+        now = time.monotonic()
+        for slot in range(self.target):
+            if slot not in self.workers and now >= self.restart_at.get(slot, 0):
+                self.spawn(slot)
+        for slot, process in list(self.workers.items()):
+            if slot >= self.target and process.poll() is None:
+                # SIGTERM lets the worker drain its in-flight messages
+                process.terminate()
+                self.failures.pop(slot, None)
+        # A worker that survived a while is considered healthy again
+        for slot in list(self.failures):
+            if slot in self.workers and now - self.restart_at.get(slot, 0) > 60:
+                self.failures.pop(slot, None)
+
+    def stop(self, timeout):
+        for process in self.workers.values():
+            if process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for slot, process in self.workers.items():
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                print(f"⚠️ {self.service_name} worker #{slot} did not drain in time, killing it")
+                process.kill()
+        self.workers.clear()
+
+
+def queue_depth(queue_name):
+    from app.config import settings
+    from helpers.queue_helper import create_queue
+
+    queue = create_queue(
+        queue_name=queue_name,
+        host=settings.RABBITMQ_HOST,
+        port=settings.RABBITMQ_PORT,
+        user=settings.RABBITMQ_USER,
+        password=settings.RABBITMQ_PASSWORD,
+        vhost=settings.RABBITMQ_VHOST
+    )
     try:
-        subprocess.run([sys.executable, "-m", module_path], check=True)
-    except Exception as e:
-        print(f"❌ Error starting {service_name} consumer: {e}")
+        return queue.depth()
+    finally:
+        queue.close()
+
+
+def supervise_consumers(stop_event):
+    """Run the consumer pools until ``stop_event`` is set, then shut them down cleanly"""
+    from app.config import settings
+
+    pools = [
+        ConsumerPool(
+            "Email Service", "micro_services.emailing_service.consumer", settings.EMAIL_QUEUE_NAME,
+            settings.EMAIL_CONSUMER_MIN_WORKERS, settings.EMAIL_CONSUMER_MAX_WORKERS,
+            settings.CONSUMER_SCALE_MESSAGES_PER_WORKER, settings.EMAIL_CONSUMER_METRICS_PORT,
+        ),
+        ConsumerPool(
+            "WhatsApp Service", "micro_services.whatsapp_service.consumer", settings.WHATSAPP_QUEUE_NAME,
+            settings.WHATSAPP_CONSUMER_MIN_WORKERS, settings.WHATSAPP_CONSUMER_MAX_WORKERS,
+            settings.CONSUMER_SCALE_MESSAGES_PER_WORKER, settings.WHATSAPP_CONSUMER_METRICS_PORT,
+        ),
+    ]
+
+    # Worker N of a pool serves metrics on its base port + N; refuse ranges that overlap
+    for index, pool in enumerate(pools):
+        for other in pools[index + 1:]:
+            if set(pool.metrics_ports) & set(other.metrics_ports):
+                print(
+                    f"❌ Metrics ports of {pool.service_name} ({pool.metrics_ports.start}-{pool.metrics_ports.stop - 1}) "
+                    f"and {other.service_name} ({other.metrics_ports.start}-{other.metrics_ports.stop - 1}) overlap; "
+                    "set EMAIL_CONSUMER_METRICS_PORT / WHATSAPP_CONSUMER_METRICS_PORT further apart"
+                )
+                raise SystemExit(1)
+
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        for pool in pools:
+            pool.metrics_dir = os.path.join(metrics_dir, pool.queue_name)
+            reset_metrics_dir(pool.metrics_dir)
+
+    if settings.CONSUMER_STRICT_ORDERING:
+        # Per-contact ordering is kept by each worker, not across workers sharing a queue
+        for pool in pools:
+            pool.min_workers = pool.max_workers = pool.target = 1
+        print("🔒 CONSUMER_STRICT_ORDERING is set, running one worker per consumer pool")
+
+    next_scale_check = 0
+    while not stop_event.is_set():
+        for pool in pools:
+            pool.reap()
+        if time.monotonic() >= next_scale_check:
+            next_scale_check = time.monotonic() + settings.CONSUMER_SCALE_INTERVAL
+            for pool in pools:
+                try:
+                    pool.rescale(queue_depth(pool.queue_name), settings.CONSUMER_SCALE_DOWN_COOLDOWN)
+                except Exception as e:
+                    print(f"⚠️ Could not read depth of '{pool.queue_name}': {e}")
+        for pool in pools:
+            pool.converge()
+        stop_event.wait(1)
+
+    print("🛑 Stopping consumer workers...")
+    for pool in pools:
+        pool.stop(timeout=settings.CONSUMER_DRAIN_TIMEOUT + 5)
+    print("✅ Consumer workers stopped")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the InfluenceFlow system")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        default="all",
+        choices=["all", "consumers"],
+        help="'all' runs the API, the WhatsApp Business service and the consumer pools; "
+             "'consumers' runs only the supervised consumer pools"
+    )
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        reset_metrics_dir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+    if args.mode == "consumers":
+        print("🚀 Starting InfluenceFlow consumer supervisor...")
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stop_event.set())
+        supervise_consumers(stop_event)
+        sys.exit(0)
+
     # Get configuration from environment variables
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
@@ -49,8 +254,8 @@ if __name__ == "__main__":
     print("🚀 Starting InfluenceFlow Complete System...")
     print(f"📍 Main API: http://{host}:{port}")
     print(f"📍 WhatsApp Business Service: http://{host}:8001")
-    print(f"📍 WhatsApp Service Consumer: Background Process")
-    print(f"📍 Email Service Consumer: Background Process")
+    print(f"📍 WhatsApp Service Consumers: Supervised Worker Pool")
+    print(f"📍 Email Service Consumers: Supervised Worker Pool")
     print(f"📚 API Documentation: http://{host}:{port}/docs")
     print("=" * 60)
     
@@ -62,16 +267,10 @@ if __name__ == "__main__":
             args=("WhatsApp Business", 8001, "micro_services.whatsapp_business.main:app"),
             daemon=True
         ),
-        # Email Service Consumer
-        threading.Thread(
-            target=run_consumer,
-            args=("Email Service", "micro_services.emailing_service.consumer"),
-            daemon=True
-        ),
-        # WhatsApp Service Consumer
+        # Email and WhatsApp consumer worker pools
         threading.Thread(
-            target=run_consumer,
-            args=("WhatsApp Service", "micro_services.whatsapp_service.consumer"),
+            target=supervise_consumers,
+            args=(stop_event,),
             daemon=True
         ),
     ]
@@ -94,5 +293,9 @@ if __name__ == "__main__":
             log_level="info" if not debug else "debug"
         )
     except KeyboardInterrupt:
+        pass
+    finally:
         print("\n🛑 Shutting down all services...")
+        stop_event.set()
+        services[1].join()
         sys.exit(0)
\ No newline at end of file